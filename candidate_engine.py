@@ -0,0 +1,121 @@
+from enum import Enum
+from typing import List, Tuple
+
+import numpy as np
+
+#####################################################################################################################################################################################
+# candidate generation for the fuzzy deduplication: all the pairs of simhashes within a hamming distance of K
+# the engines work on the positions of the hashes in the given list and return the pairs (i, j) with i < j sorted by i and j,...
+# ...so every engine returns exactly the same pairs as comparing every hash with every other hash
+
+def hamming_distance(a:int, b:int)->int:
+    '''Returns the amount of bits, which differ between the two given hashes.'''
+    return bin(a ^ b).count("1")
+
+def brute_force_candidates(hashes:List[int], K:int)->List[Tuple[int,int]]:
+    '''Compares every hash with every other hash.'''
+    return [(i, j) for i in range(len(hashes)) for j in range(i + 1, len(hashes)) if hamming_distance(hashes[i], hashes[j]) <= K]
+
+def banded_candidates(hashes:List[int], K:int, bits:int=128)->List[Tuple[int,int]]:
+    '''Splits the hashes into K+1 bands and only compares hashes sharing at least one band.
+    Two hashes within a hamming distance of K differ in at most K bands, so they are equal in at least one of the K+1 bands (pigeonhole principle).'''
+
+    # every band needs at least one bit, otherwise every pair is a candidate anyway
+    if(K + 1 > bits): return brute_force_candidates(hashes, K)
+
+    bandCount = K + 1
+    candidates = set()
+
+    shift = 0
+    for band in range(bandCount):
+        # the bits are split as evenly as possible
+        width = bits // bandCount + (1 if band < bits % bandCount else 0)
+        mask = (1 << width) - 1
+
+        # band value -> positions of all the hashes with this value, in ascending order
+        buckets = dict()
+        for i in range(len(hashes)):
+            bandValue = (hashes[i] >> shift) & mask
+            if bandValue not in buckets:
+                buckets[bandValue] = []
+            buckets[bandValue].append(i)
+
+        for positions in buckets.values():
+            for a in range(len(positions)):
+                for b in range(a + 1, len(positions)):
+                    candidates.add((positions[a], positions[b]))
+
+        shift += width
+
+    # sharing a band does not mean being within the distance
+    return [(i, j) for i, j in sorted(candidates) if hamming_distance(hashes[i], hashes[j]) <= K]
+
+#####################################################################################################################################################################################
+# vectorized version: the hashes are packed into a (n, 2) uint64 matrix (low and high 64 bits) and compared block by block using XOR and popcount
+# only the distances of two blocks exist at the same time, so the memory needed is bounded by the block size instead of n²
+
+# amount of hashes per block, 'blockSize'² distances are calculated at once
+blockSize = 512
+
+HASH_MASK = (1 << 64) - 1
+
+# amount of set bits of every byte, used if numpy has no popcount ('np.bitwise_count' needs numpy 2.0)
+__popcountTable = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+def __popcount(values:np.ndarray)->np.ndarray:
+    if(hasattr(np, "bitwise_count")): return np.bitwise_count(values)
+    return __popcountTable[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+def pack_hashes(hashes:List[int])->np.ndarray:
+    '''Packs the given hashes of up to 128 bits into a (n, 2) uint64 matrix: [low 64 bits, high 64 bits].'''
+    matrix = np.empty((len(hashes), 2), dtype=np.uint64)
+    matrix[:, 0] = [hash & HASH_MASK for hash in hashes]
+    matrix[:, 1] = [hash >> 64 for hash in hashes]
+    return matrix
+
+def blocked_candidate_arrays(matrix:np.ndarray, K:int)->Tuple[np.ndarray,np.ndarray]:
+    '''Returns the positions (i, j) with i < j of all the pairs of the given packed hashes within a hamming distance of K as two arrays sorted by i and j.'''
+
+    n = len(matrix)
+    firstParts = []
+    secondParts = []
+
+    for rowStart in range(0, n, blockSize):
+        rows = matrix[rowStart:rowStart + blockSize]
+        blockFirst = []
+        blockSecond = []
+
+        # only the blocks on and above the diagonal, since every pair is needed in only one direction
+        for colStart in range(rowStart, n, blockSize):
+            cols = matrix[colStart:colStart + blockSize]
+            distances = __popcount(rows[:, None, 0] ^ cols[None, :, 0]) + __popcount(rows[:, None, 1] ^ cols[None, :, 1])
+            matches = distances <= K
+            if(colStart == rowStart): matches = np.triu(matches, k=1)
+            first, second = np.nonzero(matches)
+            blockFirst.append(first + rowStart)
+            blockSecond.append(second + colStart)
+
+        first = np.concatenate(blockFirst)
+        second = np.concatenate(blockSecond)
+        order = np.lexsort((second, first))
+        firstParts.append(first[order])
+        secondParts.append(second[order])
+
+    if(len(firstParts) == 0): return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(firstParts), np.concatenate(secondParts)
+
+def blocked_popcount_candidates(hashes:List[int], K:int)->List[Tuple[int,int]]:
+    '''Compares every hash with every other hash using the vectorized blocks, also fast for a large K (unlike banding).'''
+    first, second = blocked_candidate_arrays(pack_hashes(hashes), K)
+    return list(zip(first.tolist(), second.tolist()))
+
+class CandidateEngine(Enum):
+    BRUTE_FORCE:str = "brute force"
+    BANDED:str = "banded"
+    BLOCKED_POPCOUNT:str = "blocked popcount"
+
+    def execute(self, hashes:List[int], K:int)->List[Tuple[int,int]]:
+        if(self == CandidateEngine.BRUTE_FORCE): return brute_force_candidates(hashes, K)
+        elif(self == CandidateEngine.BANDED): return banded_candidates(hashes, K)
+        elif(self == CandidateEngine.BLOCKED_POPCOUNT): return blocked_popcount_candidates(hashes, K)
+        else: raise TypeError("The current type %s is not supported!"%self)
@@ -1,12 +1,20 @@
-from typing import Dict, List, Set
+from typing import Dict, Iterator, List, Set, Tuple
 import pandas as pd
 import sys
+import itertools
+import re
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import psycopg2
+import psycopg2.pool
 from collections import defaultdict
 
 from enum import Enum
 
 import Logger
+import memory_handler
+from table_store import TableStore
 
 
 class CorpusType(Enum):
@@ -15,11 +23,171 @@ class CorpusType(Enum):
     MATE_MAIN = 'mate_main_tokenized'
 
 
-collectMemory = True
-memory = 0
-
 loggerActive = False
 
+# amount of rows the server-side cursors of the streaming loaders transfer per round trip
+defaultItersize = 2000
+# amount of IDs retrieved per query by the ID set loaders
+idBatchSize = 10000
+# amount of chunks of 'itersize' rows the ID set loaders fetch ahead of the consumer
+prefetchChunks = 2
+# named cursors need a name, that is unique for their connection
+__cursorCounter = itertools.count()
+
+#####################################################################################################################################################################################
+# streaming: rows are fetched with a named (server-side) cursor and finished tables are yielded one at a time
+# since all the queries are ordered by tableid, a table is finished as soon as the tableid changes
+# this way at most one table and 'itersize' rows are held in memory at the same time
+# tables of ID sets are retrieved in batches of 'idBatchSize' IDs, whose rows are streamed the same way by another thread,...
+# ...so at most one table and ('prefetchChunks' + 1) * 'itersize' rows are held in memory at the same time
+
+def __rangeCondition(startID: int, endID: int) -> str:
+    """Returns the condition selecting all the tables of the given ID range."""
+    return f'tableid >= {startID} AND tableid <= {endID}'
+
+def __query(corpus: CorpusType, condition: str, withSuperKeys: bool) -> str:
+    """Builds the query retrieving all the tupels of the given corpus, that fulfill the given condition, ordered by tableid, rowid and colid."""
+    columns = "tableid, rowid, colid, tokenized, super_key" if withSuperKeys else "tableid, rowid, colid, tokenized"
+    return f'SELECT {columns} FROM "{corpus.value}" WHERE {condition} ORDER BY tableid, rowid, colid;'
+
+def __streamRows(connection, query: str, itersize: int) -> Iterator[tuple]:
+    """Executes the given query using a named (server-side) cursor of the given connection and yields the resulting tupels one by one.
+    Only 'itersize' tupels are transferred per round trip."""
+    
+    cursor = connection.cursor(name="stream_%s"%next(__cursorCounter))
+    cursor.itersize = itersize
+    try:
+        cursor.execute(query)
+        for row in cursor:
+            # the tupels are never held all at once, so their total size is what 'fetchall()' would have needed
+            if memory_handler.collectMemory: memory_handler.add_size("raw rows", memory_handler.deep_sizeof(row))
+            yield row
+    finally:
+        cursor.close()
+
+def __produceIdSetRows(connection, query: str, idBatches: List[List[int]], itersize: int, chunks: queue.Queue, stop: threading.Event):
+    """Streams the tupels of all the given ID batches one after another using named (server-side) cursors and puts them into the given queue in chunks of 'itersize' tupels.
+    The end of the tupels is marked by 'None', an error by the exception itself."""
+    
+    def put(item) -> bool:
+        # the consumer may stop early, so the producer must not block forever on a full queue
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    try:
+        for idBatch in idBatches:
+            cursor = connection.cursor(name="stream_%s"%next(__cursorCounter))
+            cursor.itersize = itersize
+            try:
+                cursor.execute(query, (idBatch,))
+                while True:
+                    chunk = cursor.fetchmany(itersize)
+                    if(len(chunk) == 0): break
+                    if(not put(chunk)): return
+            finally:
+                cursor.close()
+        put(None)
+    except Exception as exception:
+        put(exception)
+
+def __streamIdSetRows(connection, corpus: CorpusType, ids: Set[int], withSuperKeys: bool, itersize: int, batchSize: int) -> Iterator[tuple]:
+    """Retrieves all the tupels of the tables with the given IDs and yields them one by one ordered by tableid, rowid and colid.
+    The IDs are bound as an array ('= ANY(%s)') and retrieved in sorted batches of 'batchSize' IDs, each streamed by a named (server-side) cursor.
+    While the tupels are yielded, the next 'itersize' tupels are already fetched by another thread."""
+    
+    idList = list(ids)
+    idList.sort()
+    idBatches = [idList[i:i + batchSize] for i in range(0, len(idList), batchSize)]
+    if(len(idBatches) == 0): return
+    
+    query = __query(corpus, "tableid = ANY(%s)", withSuperKeys)
+    
+    # the batches are sorted, so the tupels of consecutive batches are still ordered by tableid
+    chunks = queue.Queue(maxsize=prefetchChunks)
+    stop = threading.Event()
+    producer = threading.Thread(target=__produceIdSetRows, args=(connection, query, idBatches, itersize, chunks, stop), daemon=True)
+    producer.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if(chunk is None): return
+            if(isinstance(chunk, Exception)): raise chunk
+            
+            for row in chunk:
+                if memory_handler.collectMemory: memory_handler.add_size("raw rows", memory_handler.deep_sizeof(row))
+                yield row
+            del chunk
+    finally:
+        # the connection must not be used by the producer anymore, once the stream is closed
+        stop.set()
+        producer.join()
+
+def __groupTables(rows: Iterator[tuple], withSuperKeys: bool) -> Iterator[tuple]:
+    """Collects the given tupels, which have to be ordered by tableid, into tables and yields every table as soon as it is finished.
+    Yields '(tableid, table)' or '(tableid, table, superKeys)' if 'withSuperKeys' is set."""
+    
+    currentId = None
+    table = None
+    superKeys = None
+    
+    for row in rows:
+        # the tableid changed, so the previous table is complete
+        if(row[0] != currentId):
+            if(currentId is not None):
+                yield (currentId, table, superKeys) if withSuperKeys else (currentId, table)
+            currentId = row[0]
+            table = defaultdict(dict)
+            superKeys = defaultdict(dict)
+        
+        table[row[1]][row[2]] = str(row[3])
+        if(withSuperKeys): superKeys[row[1]] = int(row[4],2) # convert to binary int
+    
+    # the last table is only finished when there are no rows left
+    if(currentId is not None):
+        yield (currentId, table, superKeys) if withSuperKeys else (currentId, table)
+
+def __fillTableStore(rows: Iterator[tuple], withSuperKeys: bool) -> TableStore:
+    """Stores the given tupels, which have to be ordered by tableid, rowid and colid, directly into a TableStore."""
+    
+    store = TableStore()
+    for row in rows:
+        superKey = int(row[4],2) if withSuperKeys else None # convert to binary int
+        store.appendCell(row[0], row[1], row[2], str(row[3]), superKey)
+    return store
+
+def streamTestDataIdRange(connection, corpus: CorpusType, startID: int, endID: int, itersize: int = defaultItersize) -> Iterator[Tuple[int, dict]]:
+    """Streams all the tables of the given ID range from the given corpus of the given connection as '(tableid, table)' pairs.
+    Every table is a dict with a multidimensional index: [rowid][colid] -> token."""
+    
+    query = __query(corpus, __rangeCondition(startID, endID), False)
+    return __groupTables(__streamRows(connection, query, itersize), False)
+
+def streamTestDataIdSet(connection, corpus: CorpusType, ids: Set[int], itersize: int = defaultItersize, batchSize: int = None) -> Iterator[Tuple[int, dict]]:
+    """Streams all the tables of the given IDs from the given corpus of the given connection as '(tableid, table)' pairs.
+    Every table is a dict with a multidimensional index: [rowid][colid] -> token.
+    The IDs are retrieved in batches of 'batchSize' IDs (default: 'idBatchSize'), whose tupels are streamed 'itersize' tupels per round trip."""
+    
+    return __groupTables(__streamIdSetRows(connection, corpus, ids, False, itersize, batchSize or idBatchSize), False)
+
+def streamTestDataWithSuperKeysIdRange(connection, startID: int, endID: int, itersize: int = defaultItersize) -> Iterator[Tuple[int, dict, dict]]:
+    """Streams all the tables of the given ID range from the 'MATE_MAIN' corpus of the given connection as '(tableid, table, superKeys)' triples.
+    Every table is a dict with a multidimensional index: [rowid][colid] -> token. The super keys are stored as: [rowid] -> super_key."""
+    
+    query = __query(CorpusType.MATE_MAIN, __rangeCondition(startID, endID), True)
+    return __groupTables(__streamRows(connection, query, itersize), True)
+
+def streamTestDataWithSuperKeysIdSet(connection, ids: Set[int], itersize: int = defaultItersize, batchSize: int = None) -> Iterator[Tuple[int, dict, dict]]:
+    """Streams all the tables of the given IDs from the 'MATE_MAIN' corpus of the given connection as '(tableid, table, superKeys)' triples.
+    Every table is a dict with a multidimensional index: [rowid][colid] -> token. The super keys are stored as: [rowid] -> super_key.
+    The IDs are retrieved in batches of 'batchSize' IDs (default: 'idBatchSize'), whose tupels are streamed 'itersize' tupels per round trip."""
+    
+    return __groupTables(__streamIdSetRows(connection, CorpusType.MATE_MAIN, ids, True, itersize, batchSize or idBatchSize), True)
+
 #####################################################################################################################################################################################
 # first version: retrieving test data as multidimensional dict without a superkey
 # datastructure dimensions  index 1: tableid
@@ -27,58 +195,52 @@ loggerActive = False
 #                           index 3: colid
 #                           value: token
 
-def retrieveTestDataIdRange(connection, corpus: CorpusType, startID: int, endID: int) -> dict:
-    """Retrieves all the tupels from tables of the given ID range from the given corpus of the given connection and stores them into a dict with a multidimensional index."""
-    
-    cursor = connection.cursor()
-    cursor.execute(f'SELECT tableid, rowid, colid, tokenized FROM "{corpus.value}" WHERE tableid >= {startID} AND tableid <= {endID} ORDER BY tableid, rowid, colid;')
-    results = cursor.fetchall()
-    if(loggerActive): Logger.log("Retrieved Data successfully!")
-    cursor.close()
+def retrieveTestDataIdRange(connection, corpus: CorpusType, startID: int, endID: int, itersize: int = defaultItersize, compact: bool = False) -> dict:
+    """Retrieves all the tupels from tables of the given ID range from the given corpus of the given connection and stores them into a dict with a multidimensional index.
+    If 'compact' is set, the tupels are stored into a TableStore instead."""
     
-    global memory
-    if collectMemory:
-        memory = memory + sys.getsizeof(results)
+    # the tupels are stored directly into the compact TableStore
+    if(compact):
+        allTables = __fillTableStore(__streamRows(connection, __query(corpus, __rangeCondition(startID, endID), False), itersize), False)
+        if memory_handler.collectMemory: memory_handler.record_size("structured data", allTables)
+        if(loggerActive): Logger.log("Retrieved and structured Testdata!")
+        return allTables
     
     # all the tokens for each cell are stored here 
     allTables = defaultdict(lambda: defaultdict(dict))
     
-    # separate tupels by tables, rows and columns and store them in a structured manner
-    for row in results:
-        allTables[row[0]][row[1]][row[2]] = str(row[3])
+    # the tables arrive already separated by rows and columns
+    for tableid, table in streamTestDataIdRange(connection, corpus, startID, endID, itersize):
+        allTables[tableid] = table
     
-    if(loggerActive): Logger.log("Structured Testdata!")
+    if memory_handler.collectMemory:
+        memory_handler.record_size("structured data", allTables)
+    
+    if(loggerActive): Logger.log("Retrieved and structured Testdata!")
     return allTables
 
-def retrieveTestDataIdSet(connection, corpus: CorpusType, ids: Set[int])->dict:
-    """Retrieves all the tupels from tables of the given IDs from the given corpus of the given connection and stores them into a dict with a multidimensional index."""
-    
-    # prepare a string to use for the query
-    idList = list(ids)
-    idList.sort()
-    idsString = str(idList)
-    idsString = idsString.replace("[", "(")
-    idsString = idsString.replace("]", ")")
-    
-    # fetch all the tables with the given ids
-    cursor = connection.cursor()
-    cursor.execute(f'SELECT tableid, rowid, colid, tokenized FROM {corpus.value} WHERE tableid in {idsString} ORDER BY tableid, rowid, colid;')
-    results = cursor.fetchall()
-    if(loggerActive): Logger.log("Retrieved Data successfully!")
-    cursor.close()
+def retrieveTestDataIdSet(connection, corpus: CorpusType, ids: Set[int], itersize: int = defaultItersize, batchSize: int = None, compact: bool = False)->dict:
+    """Retrieves all the tupels from tables of the given IDs from the given corpus of the given connection and stores them into a dict with a multidimensional index.
+    If 'compact' is set, the tupels are stored into a TableStore instead."""
     
-    global memory
-    if collectMemory:
-        memory = memory + sys.getsizeof(results)
+    # the tupels are stored directly into the compact TableStore
+    if(compact):
+        allTables = __fillTableStore(__streamIdSetRows(connection, corpus, ids, False, itersize, batchSize or idBatchSize), False)
+        if memory_handler.collectMemory: memory_handler.record_size("structured data", allTables)
+        if(loggerActive): Logger.log("Retrieved and structured Testdata!")
+        return allTables
     
     # all the tokens for each cell are stored here 
     allTables = defaultdict(lambda: defaultdict(dict))
     
-    # separate tupels by tables, rows and columns and store them in a structured manner
-    for row in results:
-        allTables[row[0]][row[1]][row[2]] = str(row[3])
+    # the tables arrive already separated by rows and columns
+    for tableid, table in streamTestDataIdSet(connection, corpus, ids, itersize, batchSize):
+        allTables[tableid] = table
     
-    if(loggerActive): Logger.log("Structured Testdata!")
+    if memory_handler.collectMemory:
+        memory_handler.record_size("structured data", allTables)
+    
+    if(loggerActive): Logger.log("Retrieved and structured Testdata!")
     return allTables
 
 #####################################################################################################################################################################################
@@ -89,68 +251,321 @@ def retrieveTestDataIdSet(connection, corpus: CorpusType, ids: Set[int])->dict:
 #                           value: token
     
 
-def retrieveTestDataWithSuperKeysIdRange(connection, startID: int, endID: int) -> dict:
+def retrieveTestDataWithSuperKeysIdRange(connection, startID: int, endID: int, itersize: int = defaultItersize, compact: bool = False) -> dict:
     """Retrieves all the tupels from tables of the given ID range from the 'MATE_MAIN' corpus of the given connection and stores them into a dict with a multidimensional index.
-    Super Keys are retrieved also, therefore the corpus is always 'MATE_MAIN'."""
+    Super Keys are retrieved also, therefore the corpus is always 'MATE_MAIN'.
+    If 'compact' is set, the tupels are stored into a TableStore instead and the super keys are returned as a view onto it."""
     
-    cursor = connection.cursor()
-    cursor.execute(f'SELECT tableid, rowid, colid, tokenized, super_key FROM {CorpusType.MATE_MAIN.value} WHERE tableid >= {startID} AND tableid <= {endID} ORDER BY tableid, rowid, colid;')
-    results = cursor.fetchall()
-    if(loggerActive): Logger.log("Retrieved Data successfully!")
-    cursor.close()
-    
-    global memory
-    if collectMemory:
-        memory = memory + sys.getsizeof(results)
+    # the tupels are stored directly into the compact TableStore, the super keys are stored alongside the rows
+    if(compact):
+        allTablesData = __fillTableStore(__streamRows(connection, __query(CorpusType.MATE_MAIN, __rangeCondition(startID, endID), True), itersize), True)
+        if memory_handler.collectMemory: memory_handler.record_size("structured data", allTablesData)
+        Logger.log("Structured Testdata!")
+        return [allTablesData, allTablesData.superKeyView()]
     
     # all the tokens for each cell are stored here 
     allTablesData = defaultdict(lambda: defaultdict(dict))
     # all the Super Keys for each row are stored here
     allTablesSuperKey = defaultdict(lambda: defaultdict(dict))
     
-    # separate tupels by tables, rows and columns and store them in a structured manner
-    for row in results:
-        
-        allTablesData[row[0]][row[1]][row[2]] = str(row[3])
-        allTablesSuperKey[row[0]][row[1]] = int(row[4],2) # convert to binary int
+    # the tables arrive already separated by rows and columns
+    for tableid, table, superKeys in streamTestDataWithSuperKeysIdRange(connection, startID, endID, itersize):
+        allTablesData[tableid] = table
+        allTablesSuperKey[tableid] = superKeys
+    
+    if memory_handler.collectMemory:
+        memory_handler.record_size("structured data", [allTablesData, allTablesSuperKey])
     
     Logger.log("Structured Testdata!")
     return [allTablesData, allTablesSuperKey]
 
-def retrieveTestDataWithSuperKeysIdSet(connection, ids: Set[int])->dict:
+def retrieveTestDataWithSuperKeysIdSet(connection, ids: Set[int], itersize: int = defaultItersize, batchSize: int = None, compact: bool = False)->dict:
     """Retrieves all the tupels from tables of the given IDs from the 'MATE_MAIN' corpus of the given connection and stores them into a dict with a multidimensional index.
-    Super Keys are retrieved also, therefore the corpus is always 'MATE_MAIN'."""
+    Super Keys are retrieved also, therefore the corpus is always 'MATE_MAIN'.
+    If 'compact' is set, the tupels are stored into a TableStore instead and the super keys are returned as a view onto it."""
     
-    # prepare a string to use for the query
-    idList = list(ids)
-    idList.sort()
-    idsString = str(idList)
-    idsString = idsString.replace("[", "(")
-    idsString = idsString.replace("]", ")")
+    # the tupels are stored directly into the compact TableStore, the super keys are stored alongside the rows
+    if(compact):
+        allTablesData = __fillTableStore(__streamIdSetRows(connection, CorpusType.MATE_MAIN, ids, True, itersize, batchSize or idBatchSize), True)
+        if memory_handler.collectMemory: memory_handler.record_size("structured data", allTablesData)
+        if(loggerActive): Logger.log("Structured Testdata!")
+        return [allTablesData, allTablesData.superKeyView()]
     
-    # fetch all the tables with the given ids
-    cursor = connection.cursor()
-    cursor.execute(f'SELECT tableid, rowid, colid, tokenized, super_key FROM {CorpusType.MATE_MAIN.value} WHERE tableid in {idsString} ORDER BY tableid, rowid, colid;')
-    results = cursor.fetchall()
-    if(loggerActive): Logger.log("Retrieved Data successfully!")
-    cursor.close()
+    # all the tokens for each cell are stored here 
+    allTablesData = defaultdict(lambda: defaultdict(dict))
+    # all the Super Keys for each row are stored here
+    allTablesSuperKey = defaultdict(lambda: defaultdict(dict))
+    
+    # the tables arrive already separated by rows and columns
+    for tableid, table, superKeys in streamTestDataWithSuperKeysIdSet(connection, ids, itersize, batchSize):
+        allTablesData[tableid] = table
+        allTablesSuperKey[tableid] = superKeys
     
-    global memory
-    if collectMemory:
-        memory = memory + sys.getsizeof(results)
+    if memory_handler.collectMemory:
+        memory_handler.record_size("structured data", [allTablesData, allTablesSuperKey])
+    
+    if(loggerActive): Logger.log("Structured Testdata!")
+    return [allTablesData, allTablesSuperKey]
+
+#####################################################################################################################################################################################
+# parallel version: the ID range is split into shards, which are retrieved at the same time over a pool of connections
+# the result has the same structure as the one of the corresponding single connection loader
+# the pool can be any object offering 'getconn()', 'putconn(connection)' and 'maxconn' (like the pools of psycopg2.pool)
+
+def createConnectionPool(poolSize: int, **connectionArguments) -> psycopg2.pool.ThreadedConnectionPool:
+    """Creates a pool of up to 'poolSize' connections, which can be shared by threads. The arguments are the same as for 'psycopg2.connect'."""
+    return psycopg2.pool.ThreadedConnectionPool(1, poolSize, **connectionArguments)
+
+def __shardRanges(startID: int, endID: int, shardCount: int) -> List[Tuple[int, int]]:
+    """Splits the given ID range (inclusive) into at most 'shardCount' consecutive ranges of about the same size."""
+    
+    idCount = endID - startID + 1
+    if(idCount <= 0): return []
+    shardCount = max(1, min(shardCount, idCount))
+    
+    ranges = []
+    shardStart = startID
+    for shard in range(shardCount):
+        # the first shards take the remainder of the division
+        shardSize = idCount // shardCount + (1 if shard < idCount % shardCount else 0)
+        ranges.append((shardStart, shardStart + shardSize - 1))
+        shardStart += shardSize
+    return ranges
+
+def __retrieveShard(connectionPool, corpus: CorpusType, startID: int, endID: int, withSuperKeys: bool, itersize: int) -> list:
+    """Retrieves all the tables of the given ID range using a connection of the given pool and returns them as a list of tupels (see '__groupTables')."""
+    
+    connection = connectionPool.getconn()
+    try:
+        query = __query(corpus, __rangeCondition(startID, endID), withSuperKeys)
+        return list(__groupTables(__streamRows(connection, query, itersize), withSuperKeys))
+    finally:
+        connectionPool.putconn(connection)
+
+def __retrieveShardsParallel(connectionPool, corpus: CorpusType, startID: int, endID: int, withSuperKeys: bool, shardCount: int, itersize: int) -> List[list]:
+    """Retrieves all the shards of the given ID range at the same time and returns their tables ordered by the shards."""
+    
+    shards = __shardRanges(startID, endID, shardCount)
+    if(len(shards) == 0): return []
+    
+    # there can never be more threads than connections in the pool
+    with ThreadPoolExecutor(max_workers=min(len(shards), connectionPool.maxconn)) as executor:
+        futures = [executor.submit(__retrieveShard, connectionPool, corpus, shardStart, shardEnd, withSuperKeys, itersize) for shardStart, shardEnd in shards]
+        return [future.result() for future in futures]
+
+def retrieveTestDataIdRangeParallel(connectionPool, corpus: CorpusType, startID: int, endID: int, shardCount: int = 8, itersize: int = defaultItersize) -> dict:
+    """Retrieves all the tupels from tables of the given ID range from the given corpus and stores them into a dict with a multidimensional index.
+    The range is split into 'shardCount' shards, which are retrieved at the same time using the connections of the given pool."""
+    
+    # all the tokens for each cell are stored here 
+    allTables = defaultdict(lambda: defaultdict(dict))
+    
+    # the shards are disjoint, so their tables only need to be put together
+    for shardTables in __retrieveShardsParallel(connectionPool, corpus, startID, endID, False, shardCount, itersize):
+        for tableid, table in shardTables:
+            allTables[tableid] = table
+    
+    if memory_handler.collectMemory:
+        memory_handler.record_size("structured data", allTables)
+    
+    if(loggerActive): Logger.log("Retrieved and structured Testdata!")
+    return allTables
+
+def retrieveTestDataWithSuperKeysIdRangeParallel(connectionPool, startID: int, endID: int, shardCount: int = 8, itersize: int = defaultItersize) -> dict:
+    """Retrieves all the tupels from tables of the given ID range from the 'MATE_MAIN' corpus and stores them into a dict with a multidimensional index.
+    Super Keys are retrieved also, therefore the corpus is always 'MATE_MAIN'.
+    The range is split into 'shardCount' shards, which are retrieved at the same time using the connections of the given pool."""
     
     # all the tokens for each cell are stored here 
     allTablesData = defaultdict(lambda: defaultdict(dict))
     # all the Super Keys for each row are stored here
     allTablesSuperKey = defaultdict(lambda: defaultdict(dict))
     
-    # separate tupels by tables, rows and columns and store them in a structured manner
-    for row in results:
+    # the shards are disjoint, so their tables only need to be put together
+    for shardTables in __retrieveShardsParallel(connectionPool, CorpusType.MATE_MAIN, startID, endID, True, shardCount, itersize):
+        for tableid, table, superKeys in shardTables:
+            allTablesData[tableid] = table
+            allTablesSuperKey[tableid] = superKeys
+    
+    if memory_handler.collectMemory:
+        memory_handler.record_size("structured data", [allTablesData, allTablesSuperKey])
+    
+    if(loggerActive): Logger.log("Structured Testdata!")
+    return [allTablesData, allTablesSuperKey]
+
+#####################################################################################################################################################################################
+# bulk version: the tupels are exported with 'COPY (SELECT ...) TO STDOUT' instead of being fetched tupel by tupel
+# the text output of COPY is collected into large buffers, which are split and converted all at once
+# the result has the same structure as the one of the corresponding cursor based loader
+
+# amount of bytes collected before the output of COPY is parsed
+copyBufferSize = 1 << 22
+
+# escape sequences of the text format of COPY, see the postgres documentation of COPY
+__copyEscapes = {'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v'}
+__copyEscapePattern = re.compile(r'\\(x[0-9a-fA-F]{1,2}|[0-7]{1,3}|.)')
+
+def unescapeCopyField(field: str) -> str:
+    """Reverts the escaping of a single field of the text format of COPY."""
+    
+    def replace(match):
+        sequence = match.group(1)
+        if(sequence in __copyEscapes): return __copyEscapes[sequence]
+        if(sequence[0] == 'x' and len(sequence) > 1): return chr(int(sequence[1:], 16))
+        if(sequence[0] in '01234567'): return chr(int(sequence, 8))
+        return sequence
+    
+    return __copyEscapePattern.sub(replace, field)
+
+class CopyRowParser:
+    """File-like target for 'cursor.copy_expert', which parses the written text output of COPY in large buffers.
+    Every parsed batch of tupels '(tableid, rowid, colid, token[, super_key])' is handed to the given consumer."""
+    
+    def __init__(self, consumer, withSuperKeys: bool, bufferSize: int = None):
+        self.consumer = consumer
+        self.withSuperKeys = withSuperKeys
+        self.bufferSize = copyBufferSize if bufferSize is None else bufferSize
+        self.chunks = []
+        self.bufferedBytes = 0
+        # the super key of all cells of a row is the same, so it only needs to be converted once per row
+        self.lastSuperKeyString = None
+        self.lastSuperKey = None
+    
+    def write(self, data):
+        if(isinstance(data, str)): data = data.encode("utf-8")
+        self.chunks.append(data)
+        self.bufferedBytes += len(data)
+        if(self.bufferedBytes >= self.bufferSize): self.parse(False)
+    
+    def close(self):
+        """Parses all the remaining output."""
+        self.parse(True)
+    
+    def parse(self, final: bool):
+        """Parses all the complete lines of the buffered output. The last incomplete line is kept unless this is the final call."""
+        
+        buffer = b"".join(self.chunks)
+        end = len(buffer) if final else buffer.rfind(b"\n") + 1
+        self.chunks = [buffer[end:]]
+        self.bufferedBytes = len(self.chunks[0])
+        if(end <= 0): return
+        
+        lines = buffer[:end].decode("utf-8").split("\n")
+        rows = []
+        
+        for line in lines:
+            if(len(line) == 0): continue
+            fields = line.split("\t")
+            
+            token = fields[3]
+            if(token == "\\N"): token = "None" # same as str(None) of the cursor based loaders
+            elif("\\" in token): token = unescapeCopyField(token)
+            
+            if(self.withSuperKeys):
+                if(fields[4] != self.lastSuperKeyString):
+                    self.lastSuperKeyString = fields[4]
+                    self.lastSuperKey = int(fields[4], 2) # convert to binary int
+                rows.append((int(fields[0]), int(fields[1]), int(fields[2]), token, self.lastSuperKey))
+            else:
+                rows.append((int(fields[0]), int(fields[1]), int(fields[2]), token))
         
-        allTablesData[row[0]][row[1]][row[2]] = str(row[3])
-        allTablesSuperKey[row[0]][row[1]] = int(row[4],2) # convert to binary int
+        if memory_handler.collectMemory: memory_handler.record_size("raw rows", rows)
+        self.consumer(rows)
+
+def __copyRows(connection, query: str, consumer, withSuperKeys: bool):
+    """Exports the result of the given query with COPY and hands the parsed tupels to the given consumer batch by batch."""
+    
+    parser = CopyRowParser(consumer, withSuperKeys)
+    cursor = connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY ({query.rstrip(';')}) TO STDOUT", parser)
+    finally:
+        cursor.close()
+    parser.close()
+
+def bulkRetrieveTestDataIdRange(connection, corpus: CorpusType, startID: int, endID: int, compact: bool = False) -> dict:
+    """Retrieves all the tupels from tables of the given ID range from the given corpus of the given connection using COPY and stores them into a dict with a multidimensional index.
+    If 'compact' is set, the tupels are stored into a TableStore instead."""
+    
+    query = __query(corpus, __rangeCondition(startID, endID), False)
+    
+    if(compact):
+        allTables = TableStore()
+        def consumer(rows):
+            for row in rows:
+                allTables.appendCell(row[0], row[1], row[2], row[3])
+    else:
+        # all the tokens for each cell are stored here 
+        allTables = defaultdict(lambda: defaultdict(dict))
+        def consumer(rows):
+            for row in rows:
+                allTables[row[0]][row[1]][row[2]] = row[3]
+    
+    __copyRows(connection, query, consumer, False)
+    
+    if memory_handler.collectMemory:
+        memory_handler.record_size("structured data", allTables)
+    
+    if(loggerActive): Logger.log("Retrieved and structured Testdata!")
+    return allTables
+
+def bulkRetrieveTestDataWithSuperKeysIdRange(connection, startID: int, endID: int, compact: bool = False) -> dict:
+    """Retrieves all the tupels from tables of the given ID range from the 'MATE_MAIN' corpus of the given connection using COPY and stores them into a dict with a multidimensional index.
+    Super Keys are retrieved also, therefore the corpus is always 'MATE_MAIN'.
+    If 'compact' is set, the tupels are stored into a TableStore instead and the super keys are returned as a view onto it."""
+    
+    query = __query(CorpusType.MATE_MAIN, __rangeCondition(startID, endID), True)
+    
+    if(compact):
+        allTablesData = TableStore()
+        def consumer(rows):
+            for row in rows:
+                allTablesData.appendCell(row[0], row[1], row[2], row[3], row[4])
+    else:
+        # all the tokens for each cell are stored here 
+        allTablesData = defaultdict(lambda: defaultdict(dict))
+        # all the Super Keys for each row are stored here
+        allTablesSuperKey = defaultdict(lambda: defaultdict(dict))
+        def consumer(rows):
+            for row in rows:
+                allTablesData[row[0]][row[1]][row[2]] = row[3]
+                allTablesSuperKey[row[0]][row[1]] = row[4]
+    
+    __copyRows(connection, query, consumer, True)
+    
+    if(compact):
+        if memory_handler.collectMemory: memory_handler.record_size("structured data", allTablesData)
+        if(loggerActive): Logger.log("Structured Testdata!")
+        return [allTablesData, allTablesData.superKeyView()]
+    
+    if memory_handler.collectMemory:
+        memory_handler.record_size("structured data", [allTablesData, allTablesSuperKey])
     
     if(loggerActive): Logger.log("Structured Testdata!")
     return [allTablesData, allTablesSuperKey]
 
+#####################################################################################################################################################################################
+# fingerprint version: a canonical fingerprint of every table is calculated inside the database and only '(tableid, fingerprint)' pairs are transferred
+# the fingerprint is independent of the order of rows and columns and of duplicate rows, just like the preprocessing of 'index.create_exact':
+#   1) the cells of every row are sorted and concatenated
+#   2) the distinct rows of every table are sorted and concatenated
+#   3) the first 64 bit of the md5 hash of the result form the fingerprint
+# the separators are control characters, which do not appear in the tokens
 
+def retrieveTableFingerprints(connection, corpus: CorpusType, startID: int, endID: int) -> Dict[int, int]:
+    """Calculates the canonical fingerprint of every table of the given ID range from the given corpus inside the database.
+    Returns a dict mapping the tableids onto their fingerprints: tableid -> fingerprint."""
+    
+    query = f'''WITH rowStrings AS (
+                    SELECT tableid, string_agg(COALESCE(tokenized::text, 'None'), E'\\x1f' ORDER BY COALESCE(tokenized::text, 'None') COLLATE "C") COLLATE "C" AS cells
+                    FROM "{corpus.value}" WHERE {__rangeCondition(startID, endID)} GROUP BY tableid, rowid)
+                SELECT tableid, ('x' || substr(md5(string_agg(DISTINCT cells, E'\\x1e' ORDER BY cells)), 1, 16))::bit(64)::bigint
+                FROM rowStrings GROUP BY tableid ORDER BY tableid;'''
+    
+    cursor = connection.cursor()
+    cursor.execute(query)
+    fingerprints = {row[0]: row[1] for row in cursor}
+    cursor.close()
+    
+    if(loggerActive): Logger.log("Retrieved Fingerprints successfully!")
+    return fingerprints
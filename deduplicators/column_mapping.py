@@ -0,0 +1,73 @@
+from typing import Dict, List, Tuple
+
+######################################################################################################################################################
+# column mapping shared by the table comparators of both deduplicators
+# the possible columns of the smaller table for every column of the bigger table are stored as an integer bitmask (bit i: column i),...
+# ...so narrowing a mapping is a single '&' and an empty mapping is 0
+# every change is recorded on a trail, so a failed row comparison is undone by restoring the changed masks instead of copying the whole mapping
+
+def rowAttributes(row: list) -> Tuple[list, Dict[object, int], Dict[object, int], Dict[object, int]]:
+    '''Returns everything the comparators need to know about the given row:
+    (cells, cell value -> bitmask of its columns, cell value -> last column of the value, cell value -> amount of occurences).'''
+
+    valueMasks = dict()
+    lastColumns = dict()
+    valueCounts = dict()
+    for i in range(len(row)):
+        cellValue = row[i]
+        valueMasks[cellValue] = valueMasks.get(cellValue, 0) | (1 << i)
+        lastColumns[cellValue] = i
+        valueCounts[cellValue] = valueCounts.get(cellValue, 0) + 1
+
+    return (row, valueMasks, lastColumns, valueCounts)
+
+def containsValues(smaller_valueCounts: Dict[object, int], bigger_valueCounts: Dict[object, int]) -> bool:
+    '''Returns whether every cell value of the bigger row appears at least as often in the smaller row.'''
+    for cellValue in bigger_valueCounts:
+        if(smaller_valueCounts.get(cellValue, 0) < bigger_valueCounts[cellValue]): return False
+    return True
+
+class ColumnMapping:
+    '''Mapping of the columns of the bigger table onto the possible columns of the smaller table: column -> bitmask.
+    A column without an entry can still be mapped onto any column.'''
+
+    __slots__ = ("masks", "trail")
+
+    def __init__(self):
+        self.masks:Dict[int,int] = dict()
+        # (column, previous mask) of every change of the current row comparison
+        self.trail:List[Tuple[int,int]] = []
+
+    def undo(self):
+        '''Restores the mapping from before the current row comparison.'''
+        while self.trail:
+            column, mask = self.trail.pop()
+            if(mask == 0): del self.masks[column]
+            else: self.masks[column] = mask
+
+    def matchRow(self, bRow: list, bigger_lastColumns: Dict[object, int], smaller_valueMasks: Dict[object, int]) -> bool:
+        '''Narrows the mapping by the given pair of rows and returns whether the rows abide to the mapping.
+        Every cell value of the bigger row enforces, that the last column of the value in the bigger row is mapped onto one of the columns of the value in the smaller row.
+        The changes are kept only if the rows abide to the mapping, otherwise they are undone.'''
+
+        masks = self.masks
+        trail = self.trail
+
+        for cellValue in bRow:
+            column = bigger_lastColumns[cellValue]
+            mask = masks.get(column, 0)
+
+            if(mask == 0): newMask = smaller_valueMasks[cellValue]
+            else: newMask = mask & smaller_valueMasks[cellValue]
+
+            if(newMask == 0):
+                self.undo()
+                return False
+
+            if(newMask != mask):
+                trail.append((column, mask))
+                masks[column] = newMask
+
+        # the changes are accepted
+        trail.clear()
+        return True
@@ -0,0 +1,126 @@
+from collections import OrderedDict
+import sys
+from typing import Dict
+
+import Logger
+from deduplicators.column_mapping import rowAttributes
+
+######################################################################################################################################################
+# cache of the row attributes and row signatures used by the table comparators
+# every run of a deduplicator owns its own cache, so several runs can take place in the same process
+# the entries are grouped by table and the least recently used tables are evicted as soon as the estimated size exceeds the memory budget
+
+# default memory budget of a cache in bytes
+defaultMemoryBudget = 1 << 30
+
+class TableEntry:
+    '''Cached data of a single table.'''
+
+    __slots__ = ("rows", "signatures", "size")
+
+    def __init__(self):
+        # rowid -> attributes (see 'column_mapping.rowAttributes')
+        self.rows = dict()
+        # (rectangular, [(rowid, signature)...], signature -> [rowids...]) or None
+        self.signatures = None
+        # estimated amount of bytes
+        self.size = sys.getsizeof(self.rows)
+
+class ComparisonCache:
+    '''LRU cache of row attributes and row signatures, which evicts whole tables once the estimated size exceeds the memory budget.'''
+
+    def __init__(self, memoryBudget: int = None):
+        self.memoryBudget = defaultMemoryBudget if memoryBudget is None else memoryBudget
+        # tableid -> entry, the least recently used table first
+        self.tables:"OrderedDict[int,TableEntry]" = OrderedDict()
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # whether statistics of other caches were merged into this one, their size is not known here
+        self.merged = False
+
+    def __entry(self, tableId: int) -> TableEntry:
+        entry = self.tables.get(tableId)
+        if(entry is None):
+            entry = TableEntry()
+            self.tables[tableId] = entry
+            self.size += entry.size
+        else:
+            self.tables.move_to_end(tableId)
+        return entry
+
+    def __grow(self, entry: TableEntry, size: int):
+        entry.size += size
+        self.size += size
+
+        # the two most recently used tables are the ones currently compared, so they are never evicted
+        while self.size > self.memoryBudget and len(self.tables) > 2:
+            _, evicted = self.tables.popitem(last=False)
+            self.size -= evicted.size
+            self.evictions += 1
+
+    def rowAttributes(self, tableId: int, rowId: int, data: dict) -> tuple:
+        '''Returns the attributes of the given row: (cells, cell value -> bitmask of its columns, cell value -> last column of the value, cell value -> amount of occurences).'''
+
+        entry = self.__entry(tableId)
+        attributes = entry.rows.get(rowId)
+        if(attributes is not None):
+            self.hits += 1
+            return attributes
+
+        self.misses += 1
+        attributes = rowAttributes(list(data[tableId][rowId].values()))
+        entry.rows[rowId] = attributes
+        self.__grow(entry, sum(sys.getsizeof(part) for part in attributes) + sys.getsizeof(attributes))
+        return attributes
+
+    def tableSignatures(self, tableId: int, data: dict) -> tuple:
+        '''Returns the signatures of the rows of the given table: (rectangular, [(rowid, signature)...], signature -> [rowids...]).
+        The signature of a row is the sorted multiset of its cells.'''
+
+        entry = self.__entry(tableId)
+        if(entry.signatures is not None):
+            self.hits += 1
+            return entry.signatures
+
+        self.misses += 1
+        table = data[tableId]
+        rectangular = True
+        width = None
+        rowSignatures = []
+        groups = dict()
+
+        for rowId in table:
+            row = list(table[rowId].values())
+            if(width is None): width = len(row)
+            elif(width != len(row)): rectangular = False
+
+            signature = tuple(sorted(row))
+            rowSignatures.append((rowId, signature))
+            if signature not in groups:
+                groups[signature] = []
+            groups[signature].append(rowId)
+
+        entry.signatures = (rectangular, rowSignatures, groups)
+        self.__grow(entry, sys.getsizeof(rowSignatures) + sys.getsizeof(groups) + sum(sys.getsizeof(signature) + 64 for _, signature in rowSignatures))
+        return entry.signatures
+
+    def stats(self) -> Dict[str,int]:
+        '''Returns the amount of hits, misses and evicted tables.'''
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def merge(self, stats: Dict[str,int]):
+        '''Adds the given statistics of another cache (see 'stats'), e.g. of another process.'''
+        self.hits += stats["hits"]
+        self.misses += stats["misses"]
+        self.evictions += stats["evictions"]
+        self.merged = True
+
+    def log(self):
+        '''Logs the amount of hits, misses and evicted tables and the size of the cache (unless statistics of other caches were merged).'''
+        if(self.merged):
+            Logger.log("comparison cache: %s hits, %s misses, %s evicted tables"%(self.hits, self.misses, self.evictions))
+            return
+        Logger.log("comparison cache: %s hits, %s misses, %s evicted tables, %s MB"%(self.hits, self.misses, self.evictions, round(self.size / 1024 / 10.24) / 100))
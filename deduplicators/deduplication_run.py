@@ -0,0 +1,43 @@
+from typing import Dict, List, Tuple
+
+import Logger
+from deduplicators.comparison_cache import ComparisonCache
+
+######################################################################################################################################################
+# state of a single run of a deduplicator: its comparison cache, the precision calculation and the statistics of its filters and cache
+# every run owns its own object, so several runs can take place at the same time without overwriting each other's results
+# the module level results of the deduplicators (e.g. 'deduplicator.tempFPList') are only assigned from the run once it is finished
+
+class DeduplicationRun:
+    '''Comparison cache and results of a single run of a deduplicator.'''
+
+    def __init__(self, cacheMemoryBudget: int = None):
+        # the cache only lives as long as the run
+        self.cache = ComparisonCache(cacheMemoryBudget)
+
+        # precision calculation
+        self.tpCount = 0
+        self.fpCount = 0
+        # compared pairs of tables, which are no duplicates
+        self.fpList:List[Tuple[int,int]] = []
+
+        # amount of pairs each filter eliminated (see 'filters.FilterCascade')
+        self.filterStats:Dict[str,int] = dict()
+        # amount of hits, misses and evicted tables of the cache (see 'comparison_cache.ComparisonCache')
+        self.cacheStats:Dict[str,int] = dict()
+
+    def addVerdict(self, tableIdt1: int, tableIdt2: int, isDuplicate: bool):
+        '''Counts the verdict of a compared pair of tables for the precision calculation.'''
+        if(isDuplicate):
+            self.tpCount += 1
+        else:
+            self.fpList.append((tableIdt1, tableIdt2))
+            self.fpCount += 1
+
+    def precision(self) -> float:
+        '''Returns the percentage of compared pairs, which are duplicates.'''
+        return 0 if self.tpCount <= 0 else round((self.tpCount/(self.tpCount+self.fpCount))*100000)/1000
+
+    def logPrecision(self):
+        '''Logs the amount of true and false positives and the precision.'''
+        Logger.log("Found %s FP's, %s TP's -> precision = %s!"%(self.fpCount, self.tpCount, self.precision()))
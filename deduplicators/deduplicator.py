@@ -1,25 +1,31 @@
-from collections import defaultdict
-import copy
+from contextlib import nullcontext
 from enum import Enum
 import rapidfuzz
 
-from typing import Callable, Dict, Set
+from typing import Callable, Dict, Iterator, List, Set, Tuple
 from index import HashVersion, ToStringVersion
 import time_handler
 import utils
 import index
 import Logger
+import memory_handler
+import db_handler as db
+import shared_corpus
+from candidate_engine import CandidateEngine
+from persistent_index import PersistentExactIndex
+from table_store import TableStore
+from deduplicators.column_mapping import ColumnMapping, containsValues
+from deduplicators.comparison_cache import ComparisonCache
+from deduplicators.deduplication_run import DeduplicationRun
+from deduplicators.filters import FilterCascade, PairFilter, defaultFilters
+from deduplicators import grouping, scheduler
 
 ######################################################################################################################################################
 # Exact Contents
 
-# is filled up to stores a mapping of columns for potentially each row of each table
-attributeMapping_cache = defaultdict(dict)
-# stores the amount of times a value appears for every row
-attributeValueCount_cache = defaultdict(dict)
-
-def __compareTables(t1_id : int, t2_id: int, data: dict) -> bool:
-    '''Compares the to given tables and returns whether they are duplicates of the type 2+3+4'''
+def __compareTables(t1_id : int, t2_id: int, data: dict, cache: ComparisonCache) -> bool:
+    '''Compares the to given tables and returns whether they are duplicates of the type 2+3+4.
+    The attributes of the rows are taken from the given cache of the current run.'''
     
     t1_data = data[t1_id]
     t2_data = data[t2_id]
@@ -44,9 +50,7 @@ def __compareTables(t1_id : int, t2_id: int, data: dict) -> bool:
         smaller_table_id = t1_id
     
     # used for making sure the attributes of the different tables are mapped properly
-    column_mapping = dict()
-    global attributeMapping_cache
-    global attributeValueCount_cache 
+    column_mapping = ColumnMapping()
     
     # stores how many matches have been found in total
     dupRowCount = 0
@@ -58,105 +62,29 @@ def __compareTables(t1_id : int, t2_id: int, data: dict) -> bool:
     # now find out if every row of the smaller table has at least one...
     # ...corresponding row in the other table
     for sRowId in smaller_table_data:
-        sRow =  list(data[smaller_table_id][sRowId].values())
-    
-         # find or generate the attribute mapping for this row
-        if(sRowId not in attributeMapping_cache[smaller_table_id]):
-            # generate and store
-            smaller_attributeMapping:Dict[int, list] = dict()
-            for i in range(len(sRow)):
-                if(sRow[i] not in smaller_attributeMapping):
-                    smaller_attributeMapping[sRow[i]] = []
-                smaller_attributeMapping[sRow[i]].append(i)
-            attributeMapping_cache[smaller_table_id][sRowId] = smaller_attributeMapping
-        else: 
-            # use existing
-            smaller_attributeMapping = attributeMapping_cache[smaller_table_id][sRowId]
-            
-        # find or generate a map storing the amount of times any value is present in the given row
-        if sRowId not in attributeValueCount_cache[smaller_table_id]:
-            # generate and store
-            attributeCountMap = {}
-            for cellValue in sRow:
-                if cellValue in attributeCountMap:
-                    attributeCountMap[cellValue] += 1
-                else:
-                    attributeCountMap[cellValue] = 1
-            attributeValueCount_cache[smaller_table_id][sRowId] = attributeCountMap
-        else:
-            # use existing
-            attributeCountMap = attributeValueCount_cache[smaller_table_id][sRowId]
+        _, smaller_attributeMapping, _, smaller_valueCounts = cache.rowAttributes(smaller_table_id, sRowId, data)
             
         # now compare the sRow to every row of the bigger table
         # this loop does not stop after finding one duplicate row,...
         # ...so all the rows of the other table find their duplicate as well
         for bRowId in bigger_table_data:
-            bRow = list(data[bigger_table_id][bRowId].values())
+            bRow, _, bigger_attributeMapping, bigger_valueCounts = cache.rowAttributes(bigger_table_id, bRowId, data)
             
             # empty rows cannot be equal to sRow TODO check, because this sRow may be emtpy
             if(len(bRow) <= 0): continue
             
-            # the rows of the bigger table also need an attribute mapping
-            if(bRowId not in attributeMapping_cache[bigger_table_id]):
-                # generate and store
-                bigger_attributeMapping:Dict[int, list] = dict() # see later why 'list' and not 'set'
-                for i in range(len(bRow)):
-                    if(bRow[i] not in bigger_attributeMapping):
-                        bigger_attributeMapping[bRow[i]] = []
-                    bigger_attributeMapping[bRow[i]].append(i)
-                attributeMapping_cache[bigger_table_id][bRowId] = bigger_attributeMapping
-            else: 
-                # use existing
-                bigger_attributeMapping = attributeMapping_cache[bigger_table_id][bRowId]
-             
-            # this algorithm uses not the same mapping as for the bigger table
-            # instead of finding matches for lists of all indexes of the attributes,...
-            # ...only the index of the latest occurence is matched to a list of possible attributes...
-            # ...from the smaller table
-            bigger_attributeMapping ={k: bigger_attributeMapping.get(k)[-1] for k in bigger_attributeMapping} # [-1] is why 'list' ordering is important (always draws deterministic values)
-            
-            count_copy = copy.deepcopy(attributeCountMap)
-            mapping_copy = copy.deepcopy(column_mapping)
+            # check if every cell value of the bRow even exists enough times in the sRow
+            # dissallow multiple cells with the same value to connect to a single cell from the other table multiple times
+            if(not containsValues(smaller_valueCounts, bigger_valueCounts)): continue
             
-            # flags if this row comparison failed and the next one should be considered
-            fail = False
-            
-            # cell per cell comparison
-            for cellValue in bRow:
-                
-                # check if the current cell value of the bRow even exists enough times in the smaller table still
-                if cellValue not in count_copy or count_copy[cellValue] == 0: 
-                    fail = True
-                    break
-                
-                # dissallow multiple cells with the same value to connect to a single cell...
-                # ...from the other table multiple times
-                count_copy[cellValue] -= 1
-                
-                # make sure there is a proper 1-to-m attribute mapping, whereas m is the amount of colums,...
-                # ... that could still map to the column of the attribute of the other table
-                if bigger_attributeMapping[cellValue] not in mapping_copy:
-                    # every pair of matching cell values enforces a mapping of attributes for the entire table,
-                    # (but only if the row turns out to be a duplicate!)
-                    mapping_copy[bigger_attributeMapping[cellValue]] = smaller_attributeMapping[cellValue]
-                else:
-                    # in case there was already an attribute mapping stored for the two tables,...
-                    # ...this row has to abide to that mapping. Otherwise the two rows cannot be duplicates
-                    # the intersection takes out all the false mappings determined with the new information from the new pairing
-                    mapping_copy[bigger_attributeMapping[cellValue]] = utils.intersect_list(mapping_copy[bigger_attributeMapping[cellValue]], smaller_attributeMapping[cellValue])
-                    if len(mapping_copy[bigger_attributeMapping[cellValue]]) > 0:
-                        continue
-                    else:
-                        fail = True
-                        break
-                    
-            if not fail: 
+            # every pair of matching cell values enforces a mapping of attributes for the entire table,...
+            # ...but the mapping is only kept if the row turns out to be a duplicate
+            # the last column of every value of the bRow is mapped onto the possible columns of the value in the sRow
+            if(column_mapping.matchRow(bRow, bigger_attributeMapping, smaller_attributeMapping)):
                 # found a duplicate row
                 dupRowCount += 1
                 sRowMatchSet.add(sRowId)
                 bRowMatchSet.add(bRowId)
-                # only accept mappings of actual duplicate rows
-                column_mapping = mapping_copy
     
     # make sure there are enough duplicates so that it is possible all of the rows of at least one table...
     # ...have found duplicate rows in the other table
@@ -168,18 +96,309 @@ def __compareTables(t1_id : int, t2_id: int, data: dict) -> bool:
     
     return True
 
-# precision calculation
+######################################################################################################################################################
+# hash join version of '__compareTables': instead of comparing every row with every other row, the rows are joined by their signature...
+# ...(the sorted multiset of their cells), only rows with the same signature can be duplicate rows of rectangular tables with the same amount of columns
+# the joined rows are processed in the same order as the nested loops, so the column mapping and thus the result are exactly the same
+
+class VerificationVersion(Enum):
+    NESTED_LOOP:str = "nested loop"
+    HASH_JOIN:str = "hash join"
+
+def __compareTables_hashJoin(t1_id : int, t2_id: int, data: dict, cache: ComparisonCache) -> bool:
+    '''Compares the to given tables and returns whether they are duplicates of the type 2+3+4 (same result as '__compareTables').'''
+    
+    t1_data = data[t1_id]
+    t2_data = data[t2_id]
+    
+    # empty tables
+    if(len(t1_data) == 0 or len(t2_data) == 0): return False
+    
+    # compare number of columns
+    if(len(t1_data[0]) != len(t2_data[0])): return False
+    
+    # the same choice of the smaller table as in '__compareTables', since the column mapping depends on the order of the comparisons
+    if(len(t1_data) > len(t2_data)):
+        bigger_table_id = t1_id
+        smaller_table_id = t2_id
+    else:
+        bigger_table_id = t2_id
+        smaller_table_id = t1_id
+    
+    sRectangular, sRowSignatures, sGroups = cache.tableSignatures(smaller_table_id, data)
+    bRectangular, _, bGroups = cache.tableSignatures(bigger_table_id, data)
+    
+    # in tables with rows of different lengths a row can also match a longer row, which the signatures do not cover
+    if(not sRectangular or not bRectangular): return __compareTables(t1_id, t2_id, data, cache)
+    
+    # tables without columns only contain empty rows, which never match
+    if(len(t1_data[0]) == 0): return False
+    
+    # every row of both tables needs a matching row in the other table
+    if(sGroups.keys() != bGroups.keys()): return False
+    
+    # column of the bigger table -> possible columns of the smaller table
+    column_mapping = ColumnMapping()
+    
+    dupRowCount = 0
+    sRowMatchSet = set()
+    bRowMatchSet = set()
+    
+    for sRowId, signature in sRowSignatures:
+        _, smaller_attributeMapping, _, _ = cache.rowAttributes(smaller_table_id, sRowId, data)
+        
+        for bRowId in bGroups[signature]:
+            bRow, _, bigger_attributeMapping, _ = cache.rowAttributes(bigger_table_id, bRowId, data)
+            
+            # the rows have the same cells, so only the column mapping has to be checked
+            if(column_mapping.matchRow(bRow, bigger_attributeMapping, smaller_attributeMapping)):
+                # found a duplicate row
+                dupRowCount += 1
+                sRowMatchSet.add(sRowId)
+                bRowMatchSet.add(bRowId)
+    
+    minNumberRows = min(len(t1_data), len(t2_data))
+    if dupRowCount < minNumberRows or minNumberRows <= 0 : return False
+    
+    # all the rows of both tables have to have a matching row in the other table
+    if(len(sRowMatchSet) < len(data[smaller_table_id]) or len(bRowMatchSet) < len(data[bigger_table_id])): return False
+    
+    return True
+
+# results of the latest finished run, every run collects its own results (see 'deduplication_run.DeduplicationRun') and only assigns them here once it is finished
+latestRun:DeduplicationRun = None
+
+# precision calculation of the latest finished run
 fpCount = 0
 tpCount = 0
 
 tempFPList = []
 
-def deduplicate(data: dict, strFunc:ToStringVersion=ToStringVersion.FULL, hash:HashVersion=HashVersion.SIMILARITY_64_BIT) -> list:
-    '''Finds duplicate tables and groups the ids of those duplicate tables together.
-    All the sets of duplicates are returned as a list. This function determines duplicates of the type 2+3+4.'''
+# amount of pairs each filter eliminated in the latest finished run (see 'filters.FilterCascade')
+filterStats:Dict[str,int] = dict()
+# amount of hits, misses and evicted tables of the comparison cache of the latest finished run (see 'comparison_cache.ComparisonCache')
+cacheStats:Dict[str,int] = dict()
+
+# memory budget of the comparison cache of every run in bytes (None: 'comparison_cache.defaultMemoryBudget')
+cacheMemoryBudget = None
+
+def __finish(run: DeduplicationRun):
+    '''Makes the results of the given finished run the results of the latest run.'''
     
+    global latestRun
+    global fpCount
+    global tpCount
     global tempFPList
-    tempFPList.clear()
+    global filterStats
+    global cacheStats
+    latestRun = run
+    fpCount = run.fpCount
+    tpCount = run.tpCount
+    tempFPList = run.fpList
+    filterStats = run.filterStats
+    cacheStats = run.cacheStats
+
+def __compareFunction(verification: VerificationVersion) -> Callable[[int, int, dict, ComparisonCache], bool]:
+    if(verification == VerificationVersion.NESTED_LOOP): return __compareTables
+    elif(verification == VerificationVersion.HASH_JOIN): return __compareTables_hashJoin
+    else: raise TypeError("The current type %s is not supported!"%verification)
+
+# buckets with at least this many tables are split into partitions (see '__partitions'), whose classes of duplicates are built one table after another...
+# ...(see '__classesOfDuplicates'), None: never
+# the groups of duplicates are the same, but the precision calculation of the pairs within a partition is inferred from the classes instead of comparing them
+representativeBucketSize:int = 32
+
+def __partitions(tableIds: list, data: dict) -> List[List[int]]:
+    '''Splits the tables of a bucket into partitions, so that duplicates are always part of the same partition.
+    Only tables with the same amount of columns can be duplicates, and rectangular tables only if they consist of the same distinct rows...
+    ...(each row as the sorted multiset of its cells, see '__compareTables_hashJoin').
+    Rows of tables with rows of different lengths can also match longer rows, so all the tables with their amount of columns form a single partition.
+    Empty tables have no duplicates at all. Returns the partitions in the order of their first tables.'''
+    
+    # tableid -> (amount of columns, distinct rows)
+    keys = dict()
+    # amounts of columns of tables with rows of different lengths
+    irregularWidths = set()
+    
+    for tableId in tableIds:
+        table = data[tableId]
+        if(len(table) == 0):
+            keys[tableId] = (None, tableId)
+            continue
+        
+        width = len(table[0])
+        signatures = set()
+        for rowId in table:
+            row = table[rowId]
+            if(len(row) != width): irregularWidths.add(width)
+            signatures.add(tuple(sorted(row.values())))
+        keys[tableId] = (width, frozenset(signatures))
+    
+    partitions:Dict[tuple,List[int]] = dict()
+    for tableId in tableIds:
+        key = keys[tableId]
+        if(key[0] in irregularWidths): key = (key[0], None)
+        if key not in partitions:
+            partitions[key] = []
+        partitions[key].append(tableId)
+    
+    return list(partitions.values())
+
+def __classesOfDuplicates(tableIds: list, check: Callable[[int, int], bool]) -> Dict[int,int]:
+    '''Verifies a partition of a bucket by adding its tables one after another to the classes of duplicates found so far, instead of comparing every table with every other table.
+    A table is compared with the members of every class, starting with its representative (its smallest table), until it finds a duplicate in the class.
+    All the classes, in which the table found a duplicate, are merged with the table, a table without any duplicate starts a new class.
+    The classes are exactly the groups of duplicates of comparing every pair, even though the comparison is not transitive,...
+    ...but a table only needs a single comparison with a class of its duplicates, so partitions of many copies of the same table take about one comparison per table.
+    Returns the class (its representative) of every table.'''
+    
+    # representative -> members of the class, the representative first
+    classes:Dict[int,List[int]] = dict()
+    
+    for tableId in sorted(tableIds):
+        joined = []
+        for representative in classes:
+            for member in classes[representative]:
+                if(check(member, tableId)):
+                    joined.append(representative)
+                    break
+        
+        # the smallest representative of the merged classes represents the new class
+        joined.sort()
+        members = [member for representative in joined for member in classes.pop(representative)]
+        members.append(tableId)
+        classes[members[0]] = members
+    
+    return {member: representative for representative in classes for member in classes[representative]}
+
+def __classVerdicts(tableIds: list, classOf: Dict[int,int]) -> Iterator[Tuple[int,int,bool]]:
+    '''Yields every pair of tables (tableId1 < tableId2) of a bucket in the same order as comparing every table with every other table,...
+    ...and whether both tables are part of the same class of duplicates (see '__classesOfDuplicates').'''
+    for tableIdt1 in tableIds:
+        for tableIdt2 in tableIds:
+            if tableIdt1 < tableIdt2:
+                yield tableIdt1, tableIdt2, classOf[tableIdt1] == classOf[tableIdt2]
+
+def __verifyBatch(pairs: List[Tuple[int,int]], data: dict, partitions: List[List[int]], verification: VerificationVersion, filters: List[PairFilter], memoryBudget: int) -> Tuple[Dict[int,int], List[bool], Dict[str,int], Dict[str,int]]:
+    '''Verifies the given pairs of tables in another process (see 'scheduler.runBatches'), or the given partitions of a bucket by building their classes of duplicates.
+    Returns the class of every table of the partitions (None if the given pairs were compared), whether the tables of each pair are duplicates and the statistics of the filters and of the cache.'''
+    
+    data = shared_corpus.resolve(data)
+    filterCascade = FilterCascade(data, filters)
+    cache = ComparisonCache(memoryBudget)
+    compareData = data.encoded() if isinstance(data, TableStore) else data
+    compareTables = __compareFunction(verification)
+    
+    def check(tableIdt1: int, tableIdt2: int) -> bool:
+        return filterCascade.check(tableIdt1, tableIdt2) and compareTables(tableIdt1, tableIdt2, compareData, cache)
+    
+    if(partitions is None):
+        return None, [check(tableIdt1, tableIdt2) for tableIdt1, tableIdt2 in pairs], filterCascade.stats(), cache.stats()
+    
+    # only the classes are sent back, the verdicts of the pairs are inferred from them (see '__classVerdicts')
+    classOf = dict()
+    for partition in partitions:
+        classOf.update(__classesOfDuplicates(partition, check))
+    return classOf, [], filterCascade.stats(), cache.stats()
+
+def __verifyBuckets(hashMap: Dict[int,list], data: dict, run: DeduplicationRun, verification: VerificationVersion = VerificationVersion.HASH_JOIN, filters: List[PairFilter] = defaultFilters, workers: int = 1, corpus = None) -> Dict[int,list]:
+    '''Compares every table with every other table in the same bucket of the given hash index.
+    Pairs rejected by one of the given filters are not compared at all.
+    Buckets with at least 'representativeBucketSize' tables are split into partitions (see '__partitions'), whose classes of duplicates are built instead...
+    ...(see '__classesOfDuplicates'), their pairs count as duplicates for the precision calculation if both tables are part of the same class.
+    The pairs are compared by 'workers' processes (None: one per cpu), see 'scheduler'.
+    These processes read the tables from the given published corpus (see 'shared_corpus.publish'), if there is none they are published here.
+    The verdicts and statistics are collected in the given run, whose cache is used for the comparisons.
+    Returns the pairs of duplicates for every bucket containing duplicates: bucket -> [(tableId1, tableId2)...].'''
+    
+    filterCascade = FilterCascade(data, filters)
+    cache = run.cache
+    
+    if(workers == 1):
+        # the tables of a TableStore are compared using only their token ids
+        compareData = data.encoded() if isinstance(data, TableStore) else data
+        compareTables = __compareFunction(verification)
+        
+        def check(tableIdt1: int, tableIdt2: int) -> bool:
+            return filterCascade.check(tableIdt1, tableIdt2) and compareTables(tableIdt1, tableIdt2, compareData, cache)
+        
+        def verdicts():
+            # compare every table with every other table in the same bucket...
+            for bucket in hashMap:
+                # ...or only with the classes of duplicates of large buckets
+                if(representativeBucketSize is not None and len(hashMap[bucket]) >= representativeBucketSize):
+                    classOf = dict()
+                    for partition in __partitions(hashMap[bucket], compareData):
+                        classOf.update(__classesOfDuplicates(partition, check))
+                    for tableIdt1, tableIdt2, isDuplicate in __classVerdicts(hashMap[bucket], classOf):
+                        yield bucket, tableIdt1, tableIdt2, isDuplicate
+                    continue
+                
+                for tableIdt1 in hashMap[bucket]:
+                    for tableIdt2 in hashMap[bucket]:
+                        # ...but only in one direction (that is to say not both t1 <=> t2 and t2 <=> t1)
+                        if tableIdt1 < tableIdt2:
+                            yield bucket, tableIdt1, tableIdt2, check(tableIdt1, tableIdt2)
+    else:
+        # the tables of a TableStore are partitioned using only their token ids
+        partitionData = data.encoded() if isinstance(data, TableStore) else data
+        batches = scheduler.pairBatches(hashMap, data, workers, representativeBucketSize, lambda tableIds: __partitions(tableIds, partitionData))
+        # the processes share the memory budget of the cache of this run
+        memoryBudget = cache.memoryBudget // scheduler.workerCount(workers)
+        # every process only receives the ids of the tables of its batch
+        with shared_corpus.publish(data) if corpus is None else nullcontext(corpus) as corpus:
+            results = scheduler.runBatches(batches, __verifyBatch, lambda batch: (corpus.select(batch.tableIds()), batch.partitions, verification, filters, memoryBudget), workers)
+        
+        # the partitions of a bucket can be verified by several processes, so their classes are collected first: bucket -> tableid -> class
+        bucketClasses:Dict[int,Dict[int,int]] = dict()
+        for batch, (classOf, _, _, _) in zip(batches, results):
+            if(classOf is not None):
+                if(batch.bucket not in bucketClasses): bucketClasses[batch.bucket] = dict()
+                bucketClasses[batch.bucket].update(classOf)
+        
+        def verdicts():
+            # the batches are in the same order as the pairs of the serial version
+            for batch, (classOf, batchVerdicts, batchFilterStats, batchCacheStats) in zip(batches, results):
+                filterCascade.merge(batchFilterStats)
+                cache.merge(batchCacheStats)
+                if(classOf is not None):
+                    # the pairs of a bucket are inferred once, at its first batch
+                    if(batch.bucket in bucketClasses):
+                        for tableIdt1, tableIdt2, isDuplicate in __classVerdicts(hashMap[batch.bucket], bucketClasses.pop(batch.bucket)):
+                            yield batch.bucket, tableIdt1, tableIdt2, isDuplicate
+                    continue
+                for (tableIdt1, tableIdt2), isDuplicate in zip(batch.pairs, batchVerdicts):
+                    yield batch.bucket, tableIdt1, tableIdt2, isDuplicate
+    
+    duplicatesBuckets = dict()
+    
+    for bucket, tableIdt1, tableIdt2, isDuplicate in verdicts():
+        # check whether the two tables are duplicates
+        if(isDuplicate):
+            if(bucket not in duplicatesBuckets): duplicatesBuckets[bucket] = []
+            duplicatesBuckets[bucket].append((tableIdt1, tableIdt2))
+        run.addVerdict(tableIdt1, tableIdt2, isDuplicate)
+
+    run.filterStats = filterCascade.stats()
+    if(len(filters) > 0): filterCascade.log()
+    run.cacheStats = cache.stats()
+    cache.log()
+    
+    if memory_handler.collectMemory: memory_handler.record_size("comparison caches", [cache.tables, filterCascade.features])
+    return duplicatesBuckets
+
+def __groupDuplicates(duplicatesBuckets: Dict[int,list]) -> list:
+    '''Collects the pairs of duplicates of all the buckets in groups of duplicates (see 'grouping').'''
+    return grouping.groupPairs(tablePair for bucket in duplicatesBuckets for tablePair in duplicatesBuckets[bucket])
+
+def deduplicate(data: dict, strFunc:ToStringVersion=ToStringVersion.FULL, hash:HashVersion=HashVersion.SIMILARITY_64_BIT, workers:int=1, verification:VerificationVersion=VerificationVersion.HASH_JOIN, filters:List[PairFilter]=defaultFilters, run:DeduplicationRun=None) -> list:
+    '''Finds duplicate tables and groups the ids of those duplicate tables together.
+    All the sets of duplicates are returned as a list. This function determines duplicates of the type 2+3+4.
+    The index is created and the buckets are verified by 'workers' processes (None: one per cpu), the tables of every bucket are compared using the given verification.
+    Before comparing two tables, the given filters are applied in the given order (an empty list turns the filters off).
+    The results of the run are collected in the given run (default: a new one), see 'latestRun'.'''
+    
+    if(run is None): run = DeduplicationRun(cacheMemoryBudget)
     
     versionString = "%s %s"%(strFunc.value, hash.value)
     
@@ -190,89 +409,148 @@ def deduplicate(data: dict, strFunc:ToStringVersion=ToStringVersion.FULL, hash:H
         # no tables
         if(len(data) == 0):
             Logger.log("Empty Input!")
+            __finish(run)
             return []
         
-        # reset
-        global attributeMapping_cache
-        global attributeValueCount_cache
-        attributeMapping_cache = defaultdict(dict)
-        attributeValueCount_cache = defaultdict(dict) # TODO PUSH CHANGES!!
+        # the processes of both stages read the tables from the same copy in shared memory
+        with (nullcontext() if workers == 1 else shared_corpus.publish(data)) as corpus:
+        
+            with time_handler.measure_time("Hash creation"):
+                Logger.log("creating buckets and hashvalues...", end="")
+                if(workers == 1): hashMap = index.create_exact(data, strFunc, hash)
+                else: hashMap = index.create_exact_parallel(data, strFunc, hash, workers, corpus)
+                Logger.log("done!")
+
+            with time_handler.measure_time("Deduplication"):
+                Logger.log("finding duplicates...", end="")
+                duplicatesBuckets = __verifyBuckets(hashMap, data, run, verification, filters, workers, corpus)
+                Logger.log("done!")
+            
+        with time_handler.measure_time("Grouping"):
+            Logger.log("collecting duplicate pairs in groups...", end="")
+            duplicatesGroups = __groupDuplicates(duplicatesBuckets)
+            Logger.log("done!")
         
-        global fpCount
-        global tpCount
-        fpCount = 0
-        tpCount = 0
+    
+    __finish(run)
+    run.logPrecision()
+                            
+    return duplicatesGroups
+
+
+def deduplicate_pushdown(connection, corpus: db.CorpusType, startID: int, endID: int, run: DeduplicationRun = None) -> list:
+    '''Finds duplicate tables of the given ID range of the given corpus and groups the ids of those duplicate tables together.
+    All the sets of duplicates are returned as a list. This function determines duplicates of the type 2+3+4.
+    The buckets are created from fingerprints calculated inside the database (see 'db_handler.retrieveTableFingerprints').
+    Only the contents of tables sharing a bucket with other tables are retrieved, since only those need to be compared.
+    The results of the run are collected in the given run (default: a new one), see 'latestRun'.'''
+    
+    if(run is None): run = DeduplicationRun(cacheMemoryBudget)
+    
+    versionString = "database fingerprint"
+    
+    Logger.log("starting %s..."%(versionString))
+    
+    with time_handler.measure_time(versionString):
         
         with time_handler.measure_time("Hash creation"):
-            Logger.log("creating buckets and hashvalues...", end="")
-            hashMap = index.create_exact(data, strFunc, hash)
+            Logger.log("retrieving fingerprints and creating buckets...", end="")
+            fingerprints = db.retrieveTableFingerprints(connection, corpus, startID, endID)
+            
+            # buckets of fingerprints containing respective table ids
+            hashMap:Dict[int,list] = dict()
+            for tableId in fingerprints:
+                if fingerprints[tableId] not in hashMap:
+                    hashMap[fingerprints[tableId]] = []
+                hashMap[fingerprints[tableId]].append(tableId)
+            
+            # only buckets with more than one table can contain duplicates
+            hashMap = {bucket: hashMap[bucket] for bucket in hashMap if len(hashMap[bucket]) > 1}
             Logger.log("done!")
-
+        
+        # no candidates
+        if(len(hashMap) == 0):
+            Logger.log("No candidates!")
+            __finish(run)
+            return []
+        
+        with time_handler.measure_time("Retrieval"):
+            Logger.log("retrieving %s of %s tables..."%(sum(len(hashMap[bucket]) for bucket in hashMap), len(fingerprints)), end="")
+            candidateIds = {tableId for bucket in hashMap for tableId in hashMap[bucket]}
+            data = db.retrieveTestDataIdSet(connection, corpus, candidateIds)
+            Logger.log("done!")
+        
         with time_handler.measure_time("Deduplication"):
             Logger.log("finding duplicates...", end="")
+            duplicatesBuckets = __verifyBuckets(hashMap, data, run)
+            Logger.log("done!")
+            
+        with time_handler.measure_time("Grouping"):
+            Logger.log("collecting duplicate pairs in groups...", end="")
+            duplicatesGroups = __groupDuplicates(duplicatesBuckets)
+            Logger.log("done!")
+    
+    __finish(run)
+    run.logPrecision()
+    
+    return duplicatesGroups
 
-            duplicatesGroups = []
-            duplicatesBuckets = dict()
+def deduplicate_incremental(newData: dict, persistentIndex: PersistentExactIndex, loadTables: Callable[[Set[int]], dict], removedIds: Set[int] = frozenset(), run: DeduplicationRun = None) -> list:
+    '''Finds duplicate tables after adding the given new tables to the given persistent index and removing the given tables from it.
+    Only the buckets changed since the last run are verified, so the time needed depends on the new data instead of the whole corpus.
+    The tables of these buckets, which are not part of 'newData', are retrieved using 'loadTables' (e.g. "lambda ids: db.retrieveTestDataIdSet(connection, corpus, ids)").
+    Returns the sets of duplicates of the changed buckets, the sets of duplicates of all the other buckets are the same as in the previous runs.
+    This function determines duplicates of the type 2+3+4.
+    The results of the run are collected in the given run (default: a new one), see 'latestRun'.'''
+    
+    if(run is None): run = DeduplicationRun(cacheMemoryBudget)
+    
+    versionString = "incremental %s %s"%(persistentIndex.strFunc.value, persistentIndex.hashFunc.value)
+    
+    Logger.log("starting %s..."%(versionString))
+    
+    with time_handler.measure_time(versionString):
         
-            # compare every table with every other table in the same bucket...
-            for bucket in hashMap:
-                #if(len(simhashMap.get(bucket)) > 1):
-                #    Logger.log("Bucket ID %s: %s"%(bucket, simhashMap.get(bucket)))
-                for tableIdt1 in hashMap[bucket]:
-                    for tableIdt2 in hashMap[bucket]:
-                        # ...but only in one direction (that is to say not both t1 <=> t2 and t2 <=> t1)
-                        if tableIdt1 < tableIdt2:
-                            #Logger.log("Comparing %s and %s:"%(tableIdt1, tableIdt2))
-                            # check whether the two tables are duplicates
-                            if(__compareTables(tableIdt1, tableIdt2, data)):
-                                if(bucket not in duplicatesBuckets): duplicatesBuckets[bucket] = []
-                                duplicatesBuckets[bucket].append((tableIdt1, tableIdt2))
-                                tpCount += 1
-                            else:
-                                tempFPList.append((tableIdt1, tableIdt2))
-                                fpCount +=1
-
+        with time_handler.measure_time("Hash creation"):
+            Logger.log("updating buckets and hashvalues...", end="")
+            persistentIndex.remove(removedIds)
+            if(len(newData) > 0): persistentIndex.add(newData)
+            hashMap = persistentIndex.changedBuckets()
+            Logger.log("done!")
+        
+        # no candidates
+        if(len(hashMap) == 0):
+            Logger.log("No changed buckets!")
+            persistentIndex.markVerified()
+            __finish(run)
+            return []
+        
+        with time_handler.measure_time("Retrieval"):
+            candidateIds = {tableId for bucket in hashMap for tableId in hashMap[bucket]}
+            missingIds = {tableId for tableId in candidateIds if tableId not in newData}
+            Logger.log("retrieving %s of %s tables..."%(len(missingIds), len(candidateIds)), end="")
+            loadedData = loadTables(missingIds) if len(missingIds) > 0 else dict()
+            data = {tableId: newData[tableId] if tableId in newData else loadedData[tableId] for tableId in candidateIds}
+            Logger.log("done!")
+        
+        with time_handler.measure_time("Deduplication"):
+            Logger.log("finding duplicates...", end="")
+            duplicatesBuckets = __verifyBuckets(hashMap, data, run)
+            persistentIndex.markVerified()
             Logger.log("done!")
             
         with time_handler.measure_time("Grouping"):
             Logger.log("collecting duplicate pairs in groups...", end="")
-            
-            duplicatesGroups = []
-            
-            for bucket in duplicatesBuckets:
-                duplicatesList = duplicatesBuckets[bucket]
-                
-                for tablePair in duplicatesList:
-                    tableIdt1 = tablePair[0]
-                    tableIdt2 = tablePair[1]
-                    # there are only two relevant cases for pairs of duplicates in this algorithm:
-                    #   1) there is no group for the current pair of duplicates duplicates yet and the group has to be created
-                    #   2) only the higher value id needs to be added to the group of the lower value id,...
-                    #       ...since all the ids are traversed in natural number order and thus the lower value id is already present in the group
-                    
-                    # find the group to put the duplicates into (if present)
-                    fittingGroupPresent = False
-                    for group in duplicatesGroups:
-                        if(tableIdt1 in group):
-                            fittingGroupPresent = True
-                            group.add(tableIdt2)
-                            break
-                        
-                    # add a new set of duplicates if these duplicates do not have a group yet
-                    if(not fittingGroupPresent):
-                        duplicatesGroups.append({tableIdt1, tableIdt2})
-            
+            duplicatesGroups = __groupDuplicates(duplicatesBuckets)
             Logger.log("done!")
-        
     
-    precision = 0 if tpCount <= 0 else round((tpCount/(tpCount+fpCount))*100000)/1000
-    Logger.log("Found %s FP's, %s TP's -> precision = %s!"%(fpCount,tpCount, precision))
-                            
+    __finish(run)
+    run.logPrecision()
+    
     return duplicatesGroups
 
 
 
-
 ######################################################################################################################################################
 # Similar Contents
 
@@ -372,10 +650,12 @@ def calculateSimilarityScore_experimental(t1_id : int, t2_id: int, data: dict, s
     averageScore = sum(scores)/len(scores)
     return averageScore
     
-def deduplicate_fuzzy(data: dict, strFunc:ToStringVersion=ToStringVersion.FULL, K:int=3, simFunc:SimilarityFunction=SimilarityFunction.LEVENSHTEIN_SIMILARITY, simThreshold:float = 0.9, experimental:bool=False) -> list:
+def deduplicate_fuzzy(data: dict, strFunc:ToStringVersion=ToStringVersion.FULL, K:int=3, simFunc:SimilarityFunction=SimilarityFunction.LEVENSHTEIN_SIMILARITY, simThreshold:float = 0.9, experimental:bool=False, candidates:CandidateEngine=CandidateEngine.BANDED, workers:int=1, run:DeduplicationRun=None) -> list:
     '''Finds duplicate tables and groups the ids of those duplicate tables together.
     All the sets of duplicates are returned as a list. This function determines duplicates of the type 2+3+4+5.
-    Only uses Simhash 128 Bit.'''
+    Only uses Simhash 128 Bit. The pairs of tables within a hamming distance of K are found by the given candidate engine.
+    The index is created by 'workers' processes (None: one per cpu).
+    The results of the run are collected in the given run (default: a new one), see 'latestRun'.'''
     
     if(simThreshold < 0 or simThreshold > 1): 
         raise AttributeError("The given threshold %s is not between 0 and 1 (inclusive)!"%simThreshold)
@@ -386,89 +666,62 @@ def deduplicate_fuzzy(data: dict, strFunc:ToStringVersion=ToStringVersion.FULL,
     versionString = "fuzzy %s %s with treshold %s"%(strFunc.value, hash.value, simThreshold)
     Logger.log("starting %s..."%(versionString))
     
-    global tempFPList
-    tempFPList.clear()
+    if(run is None): run = DeduplicationRun(cacheMemoryBudget)
     
     with time_handler.measure_time(versionString):
     
         # no tables
         if(len(data) == 0):
             Logger.log("Empty Input!")
+            __finish(run)
             return []
         
-        # reset
-        global fpCount
-        global tpCount
-        fpCount = 0
-        tpCount = 0
-        
         with time_handler.measure_time("Hash creation"):
             Logger.log("creating buckets and hashvalues...", end="")
             
             # the data is preprocessed here, since it is only needed preprocessed later on
             data = index.preprocessData(data)
-            hashMap = index.create_fuzzy(data, strFunc, True)
+            if memory_handler.collectMemory: memory_handler.record_size("preprocessed data", data)
+            if(workers == 1): hashMap = index.create_fuzzy(data, strFunc, True)
+            else: hashMap = index.create_fuzzy_parallel(data, strFunc, True, workers)
             Logger.log("done!")
             
         with time_handler.measure_time("Deduplication"):
             Logger.log("finding duplicates...", end="")
 
             duplicatesPairs = []
-        
-            # compare every table with every other table, sadly there is no bucket optimization here
-            for tableIdt1 in data:
-                for tableIdt2 in data:
-                    # ...but only in one direction (that is to say not both t1 <=> t2 and t2 <=> t1)
-                    if tableIdt1 < tableIdt2:
-                        
-                        # simhash filter 
-                        bitDifference = bin(hashMap[tableIdt1] ^ hashMap[tableIdt2]).count("1")
-                        if(bitDifference > K): continue
-                        
-                        score = 0
-                        if(experimental): score = calculateSimilarityScore_experimental(tableIdt1, tableIdt2, data, simFunc)
-                        else: score = calculateSimilarityScore(tableIdt1, tableIdt2, data, simFunc)
-                        
-                        # check whether the two tables are duplicates using similarity
-                        if(score >= simThreshold):
-                            duplicatesPairs.append((tableIdt1, tableIdt2))
-                            tpCount += 1
-                        else:
-                            tempFPList.append((tableIdt1, tableIdt2))
-                            fpCount +=1
+            
+            # simhash filter: only the pairs of tables within a hamming distance of K are compared
+            tableIds = list(data)
+            candidatePairs = candidates.execute([hashMap[tableId] for tableId in tableIds], K)
+            
+            # every pair is compared in only one direction (that is to say not both t1 <=> t2 and t2 <=> t1),...
+            # ...in the same order as comparing every table with every other table in the order of the data
+            candidatePairs = sorted((i, j) if tableIds[i] < tableIds[j] else (j, i) for i, j in candidatePairs)
+            
+            for i, j in candidatePairs:
+                tableIdt1 = tableIds[i]
+                tableIdt2 = tableIds[j]
+                
+                score = 0
+                if(experimental): score = calculateSimilarityScore_experimental(tableIdt1, tableIdt2, data, simFunc)
+                else: score = calculateSimilarityScore(tableIdt1, tableIdt2, data, simFunc)
+                
+                # check whether the two tables are duplicates using similarity
+                if(score >= simThreshold): duplicatesPairs.append((tableIdt1, tableIdt2))
+                run.addVerdict(tableIdt1, tableIdt2, score >= simThreshold)
         
             Logger.log("done!")
     
         with time_handler.measure_time("Grouping"):
             Logger.log("collecting duplicate pairs in groups...", end="")
             
-            duplicatesGroups = []
-            
-
-            for tablePair in duplicatesPairs:
-                tableIdt1 = tablePair[0]
-                tableIdt2 = tablePair[1]
-                # there are only two relevant cases for pairs of duplicates in this algorithm:
-                #   1) there is no group for the current pair of duplicates duplicates yet and the group has to be created
-                #   2) only the higher value id needs to be added to the group of the lower value id,...
-                #       ...since all the ids are traversed in natural number order and thus the lower value id is already present in the group
-                
-                # find the group to put the duplicates into (if present)
-                fittingGroupPresent = False
-                for group in duplicatesGroups:
-                    if(tableIdt1 in group):
-                        fittingGroupPresent = True
-                        group.add(tableIdt2)
-                        break
-                    
-                # add a new set of duplicates if these duplicates do not have a group yet
-                if(not fittingGroupPresent):
-                    duplicatesGroups.append({tableIdt1, tableIdt2})
+            duplicatesGroups = grouping.groupPairs(duplicatesPairs)
             
             Logger.log("done!")
         
     
-    precision = 0 if tpCount <= 0 else round((tpCount/(tpCount+fpCount))*100000)/1000
-    Logger.log("Found %s FP's, %s TP's -> precision = %s!"%(fpCount,tpCount, precision))
+    __finish(run)
+    run.logPrecision()
     
     return duplicatesGroups
\ No newline at end of file
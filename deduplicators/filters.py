@@ -0,0 +1,103 @@
+from enum import Enum
+from typing import Dict, List
+
+import Logger
+
+######################################################################################################################################################
+# cheap filters rejecting pairs of tables before the expensive table comparison
+# two rectangular tables with the same amount of columns are only duplicates of the type 2+3+4, if they consist of the same distinct rows...
+# ...(each row as the sorted multiset of its cells), so every feature of the distinct rows has to be the same for both tables
+# tables with rows of different lengths are never rejected, since their rows can also match longer rows
+
+HASH_MASK = (1 << 64) - 1
+
+class TableFeatures:
+    '''Features of the distinct rows of a table, which are calculated once per table.'''
+
+    __slots__ = ("rectangular", "signatures", "lengthHistogram", "cellHash")
+
+    def __init__(self, table: dict):
+        self.rectangular = True
+        width = None
+        # distinct rows as sorted tuples of their cells
+        self.signatures = set()
+
+        for rowid in table:
+            row = list(table[rowid].values())
+            if(width is None): width = len(row)
+            elif(width != len(row)): self.rectangular = False
+            self.signatures.add(tuple(sorted(row)))
+
+        # sorted lengths of all the cells of the distinct rows
+        self.lengthHistogram = tuple(sorted(len(str(cell)) for signature in self.signatures for cell in signature))
+        # order invariant hash of all the cells of the distinct rows (only valid during this run, since 'hash' of strings is randomized per process)
+        self.cellHash = sum(hash(cell) for signature in self.signatures for cell in signature) & HASH_MASK
+
+class PairFilter(Enum):
+    DISTINCT_ROW_COUNT:str = "distinct row count"
+    CELL_LENGTH_HISTOGRAM:str = "cell length histogram"
+    CELL_MULTISET_HASH:str = "cell multiset hash"
+    DISTINCT_ROW_SIGNATURES:str = "distinct row signatures"
+
+    def execute(self, t1_features: TableFeatures, t2_features: TableFeatures) -> bool:
+        '''Returns whether the two tables can still be duplicates.'''
+        if(self == PairFilter.DISTINCT_ROW_COUNT): return len(t1_features.signatures) == len(t2_features.signatures)
+        elif(self == PairFilter.CELL_LENGTH_HISTOGRAM): return t1_features.lengthHistogram == t2_features.lengthHistogram
+        elif(self == PairFilter.CELL_MULTISET_HASH): return t1_features.cellHash == t2_features.cellHash
+        elif(self == PairFilter.DISTINCT_ROW_SIGNATURES): return t1_features.signatures == t2_features.signatures
+        else: raise TypeError("The current type %s is not supported!"%self)
+
+# all the filters from the cheapest to the most expensive one
+defaultFilters:List[PairFilter] = [PairFilter.DISTINCT_ROW_COUNT, PairFilter.CELL_LENGTH_HISTOGRAM, PairFilter.CELL_MULTISET_HASH, PairFilter.DISTINCT_ROW_SIGNATURES]
+
+class FilterCascade:
+    '''Applies the given filters one after another to pairs of tables and counts how many pairs each filter eliminated.'''
+
+    def __init__(self, data: dict, filters: List[PairFilter] = defaultFilters):
+        self.data = data
+        self.filters = list(filters)
+        # tableid -> features
+        self.features:Dict[int,TableFeatures] = dict()
+        # filter -> amount of pairs it eliminated
+        self.eliminated:Dict[PairFilter,int] = {pairFilter: 0 for pairFilter in self.filters}
+        # amount of pairs, which passed all the filters
+        self.passed = 0
+
+    def __tableFeatures(self, tableId: int) -> TableFeatures:
+        if(tableId not in self.features):
+            self.features[tableId] = TableFeatures(self.data[tableId])
+        return self.features[tableId]
+
+    def check(self, t1_id: int, t2_id: int) -> bool:
+        '''Returns whether the two given tables can still be duplicates and have to be compared.'''
+
+        if(len(self.filters) > 0):
+            t1_features = self.__tableFeatures(t1_id)
+            t2_features = self.__tableFeatures(t2_id)
+
+            if(t1_features.rectangular and t2_features.rectangular):
+                for pairFilter in self.filters:
+                    if(not pairFilter.execute(t1_features, t2_features)):
+                        self.eliminated[pairFilter] += 1
+                        return False
+
+        self.passed += 1
+        return True
+
+    def stats(self) -> Dict[str,int]:
+        '''Returns the amount of pairs each filter eliminated and the amount of pairs, which passed all the filters.'''
+        stats = {pairFilter.value: self.eliminated[pairFilter] for pairFilter in self.filters}
+        stats["passed"] = self.passed
+        return stats
+
+    def merge(self, stats: Dict[str,int]):
+        '''Adds the given statistics of another cascade (see 'stats'), e.g. of another process.'''
+        for pairFilter in self.filters:
+            self.eliminated[pairFilter] += stats.get(pairFilter.value, 0)
+        self.passed += stats.get("passed", 0)
+
+    def log(self):
+        '''Logs the amount of pairs each filter eliminated.'''
+        for pairFilter in self.filters:
+            Logger.log("%s filter: eliminated %s pairs"%(pairFilter.value, self.eliminated[pairFilter]))
+        Logger.log("%s pairs passed all the filters"%self.passed)
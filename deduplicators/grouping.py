@@ -0,0 +1,75 @@
+from typing import Dict, Iterable, List, Set, Tuple
+
+######################################################################################################################################################
+# grouping of pairs of duplicates into groups of duplicates (the connected components of the pairs)
+# the pairs are added one after another into a union-find with path compression and union by rank, so grouping takes near-linear time...
+# ...and two groups are merged as soon as any pair connects them, no matter in which order the pairs arrive
+# the groups are returned in the order their first table appeared in the pairs
+
+class UnionFind:
+    '''Disjoint sets of table ids, which are merged by pairs of duplicates.'''
+
+    __slots__ = ("parent", "rank")
+
+    def __init__(self):
+        # tableid -> parent tableid (roots are their own parent), in the order the tables appeared
+        self.parent:Dict[int,int] = dict()
+        # root -> upper bound of the height of its tree
+        self.rank:Dict[int,int] = dict()
+
+    def find(self, tableId: int) -> int:
+        '''Returns the root of the set of the given table, unknown tables are added as a set of their own.'''
+
+        parent = self.parent
+        if tableId not in parent:
+            parent[tableId] = tableId
+            self.rank[tableId] = 0
+            return tableId
+
+        root = tableId
+        while parent[root] != root:
+            root = parent[root]
+
+        # path compression: every table on the path points to the root directly
+        while parent[tableId] != root:
+            parent[tableId], tableId = root, parent[tableId]
+
+        return root
+
+    def union(self, tableIdt1: int, tableIdt2: int):
+        '''Merges the sets of the two given tables.'''
+
+        root1 = self.find(tableIdt1)
+        root2 = self.find(tableIdt2)
+        if(root1 == root2): return
+
+        # union by rank: the lower tree is attached to the higher one
+        if(self.rank[root1] < self.rank[root2]): root1, root2 = root2, root1
+        self.parent[root2] = root1
+        if(self.rank[root1] == self.rank[root2]): self.rank[root1] += 1
+        del self.rank[root2]
+
+    def addPairs(self, pairs: Iterable[Tuple[int,int]]):
+        '''Merges the sets of the tables of every given pair of duplicates.'''
+        for tableIdt1, tableIdt2 in pairs:
+            self.union(tableIdt1, tableIdt2)
+
+    def groups(self) -> List[Set[int]]:
+        '''Returns all the sets with more than one table.'''
+
+        groupIndex:Dict[int,int] = dict()
+        groups:List[Set[int]] = []
+        for tableId in self.parent:
+            root = self.find(tableId)
+            if root not in groupIndex:
+                groupIndex[root] = len(groups)
+                groups.append(set())
+            groups[groupIndex[root]].add(tableId)
+
+        return [group for group in groups if len(group) > 1]
+
+def groupPairs(pairs: Iterable[Tuple[int,int]]) -> List[Set[int]]:
+    '''Collects the given pairs of duplicates in groups of duplicates.'''
+    unionFind = UnionFind()
+    unionFind.addPairs(pairs)
+    return unionFind.groups()
@@ -1,18 +1,25 @@
-import utils
-
-from collections import defaultdict
-import copy
-from typing import Set
+from typing import Dict, List, Set, Tuple
 import Logger
 import time_handler
+import memory_handler
+import shared_corpus
+from table_store import TableStore
+from deduplicators.column_mapping import ColumnMapping, containsValues
+from deduplicators.comparison_cache import ComparisonCache
+from deduplicators.deduplication_run import DeduplicationRun
+from deduplicators import grouping, scheduler
+
+# results of the latest finished run, every run collects its own results (see 'deduplication_run.DeduplicationRun') and only assigns them here once it is finished
+latestRun:DeduplicationRun = None
+# amount of hits, misses and evicted tables of the comparison cache of the latest finished run (see 'comparison_cache.ComparisonCache')
+cacheStats:Dict[str,int] = dict()
 
-# is filled up to stores a mapping of columns for potentially each row of each table
-attributeMapping_cache = defaultdict(dict)
-# stores the amount of times a value appears for every row
-attributeValueCount_cache = defaultdict(dict)
+# memory budget of the comparison cache of every run in bytes (None: 'comparison_cache.defaultMemoryBudget')
+cacheMemoryBudget = None
 
-def __compareTables(t1_id : int, t2_id: int, data: dict, duplicateRowsAllowed: bool) -> bool:
-    '''Compares the to given tables and returns whether they are equal'''
+def __compareTables(t1_id : int, t2_id: int, data: dict, duplicateRowsAllowed: bool, cache: ComparisonCache) -> bool:
+    '''Compares the to given tables and returns whether they are equal.
+    The attributes of the rows are taken from the given cache of the current run.'''
     
     t1_superkeys = data[1][t1_id]
     t2_superkeys = data[1][t2_id]
@@ -37,10 +44,8 @@ def __compareTables(t1_id : int, t2_id: int, data: dict, duplicateRowsAllowed: b
         smaller_table_id = t1_id
     
     # used for making sure the attributes of the different tables are mapped properly
-    column_mapping = dict()
-    global attributeMapping_cache
+    column_mapping = ColumnMapping()
     hashjoinMap = dict()
-    global attributeValueCount_cache 
     
     # creates a hash index: superkey -> [table_ids...]
     for bRowId in bigger_table_superkeys:
@@ -74,106 +79,32 @@ def __compareTables(t1_id : int, t2_id: int, data: dict, duplicateRowsAllowed: b
             if superkey_small not in hashjoinMap:
                 return False
             
-            sRow =  list(data[0][smaller_table_id][sRowId].values())
-            
-            # find or generate the attribute mapping for this row
-            if(sRowId not in attributeMapping_cache[smaller_table_id]):
-                # generate and store
-                smaller_attributeMapping = dict()
-                for i in range(len(sRow)):
-                    if(sRow[i] not in smaller_attributeMapping):
-                        smaller_attributeMapping[sRow[i]] = []
-                    smaller_attributeMapping[sRow[i]].append(i)
-                attributeMapping_cache[smaller_table_id][sRowId] = smaller_attributeMapping
-            else: 
-                # use existing
-                smaller_attributeMapping = attributeMapping_cache[smaller_table_id][sRowId]
-            
-            # find or generate a map storing the amount of times any value is present in the given row
-            if sRowId not in attributeValueCount_cache[smaller_table_id]:
-                # generate and store
-                attributeCountMap = {}
-                for cellValue in sRow:
-                    if cellValue in attributeCountMap:
-                        attributeCountMap[cellValue] += 1
-                    else:
-                        attributeCountMap[cellValue] = 1
-                attributeValueCount_cache[smaller_table_id][sRowId] = attributeCountMap
-            else:
-                # use existing
-                attributeCountMap = attributeValueCount_cache[smaller_table_id][sRowId]
+            # find or generate the attributes for this row
+            _, smaller_attributeMapping, _, smaller_valueCounts = cache.rowAttributes(smaller_table_id, sRowId, data[0])
                 
             # now compare the sRow to every row of the bigger table in the same bucket as this sRow
             # this loop does not stop after finding one duplicate row,...
             # ...so all the rows of the other table find their duplicate as well
             for bRowId in hashjoinMap[superkey_small]: 
                 
-                bRow = list(data[0][bigger_table_id][bRowId].values())
+                # the rows of the bigger table also need their attributes
+                bRow, _, bigger_attributeMapping, bigger_valueCounts = cache.rowAttributes(bigger_table_id, bRowId, data[0])
                 
                 # empty rows cannot be equal to sRow TODO check, because this sRow may be emtpy
                 if(len(bRow) <= 0): continue
                 
-                # the rows of the bigger table also need an attribute mapping
-                if(bRowId not in attributeMapping_cache[bigger_table_id]):
-                    # generate and store
-                    bigger_attributeMapping = dict()
-                    for i in range(len(bRow)):
-                        if(bRow[i] not in bigger_attributeMapping):
-                            bigger_attributeMapping[bRow[i]] = []
-                        bigger_attributeMapping[bRow[i]].append(i)
-                    attributeMapping_cache[bigger_table_id][bRowId] = bigger_attributeMapping
-                else: 
-                    # use existing
-                    bigger_attributeMapping = attributeMapping_cache[bigger_table_id][bRowId]
-                    
-                # this algorithm uses not the same mapping as for the bigger table
-                # instead of finding matches for lists of all indexes of the attributes,...
-                # ...only the index of the latest occurence is matched to a list of possible attributes...
-                # ...from the smaller table
-                bigger_attributeMapping ={k: bigger_attributeMapping.get(k)[-1] for k in bigger_attributeMapping}    
-                    
-                count_copy = copy.deepcopy(attributeCountMap)
-                mapping_copy = copy.deepcopy(column_mapping) # FIX 1: do not commit change until after the row is proven duplicate
-                
-                # flags if this row comparison failed and the next one should be considered
-                fail = False
+                # check if every cell value of the bRow even exists enough times in the sRow
+                # dissallow multiple cells with the same value to connect to a single cell from the other table multiple times
+                if(not containsValues(smaller_valueCounts, bigger_valueCounts)): continue
                 
-                # analogous to a cell per cell comparison
-                for cellValue in bRow:
-                    
-                    # check if the current cell value of the bRow even exists enough times in the smaller table still
-                    if cellValue not in count_copy or count_copy[cellValue] == 0: 
-                        fail = True
-                        break
-                    
-                    # dissallow multiple cells with the same value to connect to a single cell...
-                    # ...from the other table multiple times
-                    count_copy[cellValue] -= 1
-                    
-                    # make sure there is a proper 1-to-m attribute mapping, whereas m is the amount of colums,...
-                    # ... that could still map to the column of the attribute of the other table
-                    if bigger_attributeMapping[cellValue] not in mapping_copy:
-                        # every pair of matching cell values enforces a mapping of attributes for the entire table,
-                        # (but only if the row turns out to be a duplicate!)
-                        mapping_copy[bigger_attributeMapping[cellValue]] = smaller_attributeMapping[cellValue]
-                    else:
-                        # in case there was already an attribute mapping stored for the two tables,...
-                        # ...this row has to abide to that mapping. Otherwise the two rows cannot be duplicates
-                        # the intersection takes out all the false mappings determined with the new information from the new pairing
-                        mapping_copy[bigger_attributeMapping[cellValue]] = utils.intersect_list(mapping_copy[bigger_attributeMapping[cellValue]], smaller_attributeMapping[cellValue]) # FIX 2
-                        if len(mapping_copy[bigger_attributeMapping[cellValue]]) > 0:
-                            continue
-                        else:
-                            fail = True
-                            break
-                        
-                if not fail: 
+                # make sure there is a proper 1-to-m attribute mapping, whereas m is the amount of colums,...
+                # ... that could still map to the column of the attribute of the other table
+                # the mapping is only changed if the row turns out to be a duplicate
+                if(column_mapping.matchRow(bRow, bigger_attributeMapping, smaller_attributeMapping)):
                     # found a duplicate row
                     dupRowCount += 1
                     sRowMatchSet.add(sRowId)
                     bRowMatchSet.add(bRowId)
-                    # only accept mappings of actual duplicate rows
-                    column_mapping = mapping_copy
           
     # make sure there are enough duplicates so that it is possible all of the rows of at least one table...
     # ...have found duplicate rows in the other table
@@ -187,10 +118,29 @@ def __compareTables(t1_id : int, t2_id: int, data: dict, duplicateRowsAllowed: b
     # finnaly, only if all checks were passed, the duplicate is detected
     return True
 
-def deduplicate(data: dict, duplicateRowsAllowed:bool = True) -> list:
+def __verifyBatch(pairs: List[Tuple[int,int]], data: list, duplicateRowsAllowed: bool, memoryBudget: int) -> Tuple[List[bool], Dict[str,int]]:
+    '''Compares the given pairs of tables in another process (see 'scheduler.runBatches').
+    Returns whether the tables of each pair are duplicates and the statistics of the cache.'''
+    
+    data = shared_corpus.resolve(data)
+    cache = ComparisonCache(memoryBudget)
+    # the tables of a TableStore are compared using only their token ids
+    if(isinstance(data[0], TableStore)):
+        data = [data[0].encoded(), data[1]]
+    
+    verdicts = [__compareTables(tableIdt1, tableIdt2, data, duplicateRowsAllowed, cache) for tableIdt1, tableIdt2 in pairs]
+    return verdicts, cache.stats()
+
+def deduplicate(data: dict, duplicateRowsAllowed:bool = True, workers:int = 1, run:DeduplicationRun = None) -> list:
     '''Finds duplicate tables using hashtables and groups the ids of those duplicate tables together. 
     All the sets of duplicates are returned as a list. This function determines duplicates of the type 2+3+4.
-    Duplicates of the type 4 can be turned off by setting 'duplicateRowsAllowed' to False.'''
+    Duplicates of the type 4 can be turned off by setting 'duplicateRowsAllowed' to False.
+    The tables are compared by 'workers' processes (None: one per cpu), see 'scheduler'.
+    The statistics of the run are collected in the given run (default: a new one), see 'latestRun'.'''
+    
+    global latestRun
+    global cacheStats
+    if(run is None): run = DeduplicationRun(cacheMemoryBudget)
     
     Logger.log("starting Hash-XASH Deduplicator...")
     
@@ -199,13 +149,11 @@ def deduplicate(data: dict, duplicateRowsAllowed:bool = True) -> list:
         # no tables
         if(len(data[0]) == 0):
             Logger.log("Empty Input!")
+            latestRun = run
+            cacheStats = run.cacheStats
             return []
         
-        # reset global caches
-        global attributeMapping_cache
-        attributeMapping_cache = defaultdict(dict)
-        global attributeValueCount_cache
-        attributeValueCount_cache = defaultdict(dict)
+        cache = run.cache
         
         
         Logger.log("creating buckets...", end="")
@@ -223,30 +171,45 @@ def deduplicate(data: dict, duplicateRowsAllowed:bool = True) -> list:
 
         Logger.log("done!\nfinding duplicates...", end="")
 
-        duplicatesGroups = []
+        if(workers == 1):
+            # the tables of a TableStore are compared using only their token ids
+            compareData = [data[0].encoded(), data[1]] if isinstance(data[0], TableStore) else data
+            
+            def verdicts():
+                # compare every table with every other table...
+                for num_cols, tableIds in tablesBuckets.items():
+                    for tableIdt1 in tableIds:
+                        for tableIdt2 in tableIds:
+                            # ...but only in one direction (that is to say not both t1 <=> t2 and t2 <=> t1)
+                            if tableIdt1 < tableIdt2:
+                                yield tableIdt1, tableIdt2, __compareTables(tableIdt1, tableIdt2, compareData, duplicateRowsAllowed, cache)
+        else:
+            batches = scheduler.pairBatches(tablesBuckets, data[0], workers)
+            # the processes share the memory budget of the cache of this run
+            memoryBudget = cache.memoryBudget // scheduler.workerCount(workers)
+            # every process only receives the ids of the tables of its batch, the tables (and superkeys) are read from shared memory
+            with shared_corpus.publish(data[0], data[1]) as corpus:
+                results = scheduler.runBatches(batches, __verifyBatch, lambda batch: (corpus.select(batch.tableIds()), duplicateRowsAllowed, memoryBudget), workers)
+            
+            def verdicts():
+                # the batches are in the same order as the pairs of the serial version
+                for batch, (batchVerdicts, batchCacheStats) in zip(batches, results):
+                    cache.merge(batchCacheStats)
+                    for (tableIdt1, tableIdt2), isDuplicate in zip(batch.pairs, batchVerdicts):
+                        yield tableIdt1, tableIdt2, isDuplicate
 
-        # compare every table with every other table...
-        for num_cols, tableIds in tablesBuckets.items():
-            for tableIdt1 in tableIds:
-                for tableIdt2 in tableIds:
-                    # ...but only in one direction (that is to say not both t1 <=> t2 and t2 <=> t1)
-                    if tableIdt1 < tableIdt2:
-                        # check whether the two tables are duplicates
-                        # in case they are duplicates one of 2 cases can happen:
-                        #   1) there is no goup for the duplicates yet and it has to be created
-                        #   2) only the higher value id needs to be added to the goup of the lower value id, since all the ids are traversed in natural number order
-                        if(__compareTables(tableIdt1, tableIdt2, data, duplicateRowsAllowed)):
-                            # find the group to put the duplicates into (if present)
-                            fittingGroupPresent = False
-                            for group in duplicatesGroups:
-                                if(tableIdt1 in group):
-                                    fittingGroupPresent = True
-                                    group.add(tableIdt2)
-                                    break
-                            # add a new set of duplicates if these duplicates do not have a group yet
-                            if(not fittingGroupPresent):
-                                duplicatesGroups.append({tableIdt1, tableIdt2})
+        # the pairs of duplicates are grouped as soon as they are found
+        groups = grouping.UnionFind()
+        for tableIdt1, tableIdt2, isDuplicate in verdicts():
+            # check whether the two tables are duplicates
+            if(isDuplicate): groups.union(tableIdt1, tableIdt2)
+        duplicatesGroups = groups.groups()
         
         Logger.log("done!")
+        run.cacheStats = cache.stats()
+        latestRun = run
+        cacheStats = run.cacheStats
+        cache.log()
+        if memory_handler.collectMemory: memory_handler.record_size("comparison caches", cache.tables)
                             
     return duplicatesGroups
\ No newline at end of file
@@ -0,0 +1,103 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+from typing import Callable, Dict, Hashable, List, Tuple
+
+######################################################################################################################################################
+# scheduler verifying the pairs of tables of independent buckets in a pool of processes
+# the pairs of every bucket are split into batches of roughly the same estimated cost (rows × cols of both tables of every pair),...
+# ...so a single large bucket is spread across several processes as well
+# the batches are submitted from the most to the least expensive one (longest processing time first), so idle processes always take on...
+# ...the largest remaining batch, and the results are returned in the order of the batches, which is the order of the serial version
+# the processes read their tables from a published corpus (see 'shared_corpus'), so only the ids of the tables are sent to them
+# large buckets can also be split into partitions instead, which are verified as a whole (e.g. by building their classes of duplicates one table after another)
+# the partitions are put into batches of roughly the same estimated cost just like the pairs, so the partitions of a large bucket are spread across processes as well
+
+# amount of batches per process, more batches balance the work better but the same tables are read by several processes
+batchesPerWorker:int = 4
+
+class PairBatch:
+    '''Pairs of tables (tableId1, tableId2) of one bucket, which are verified by the same process.
+    If 'partitions' is set, the batch contains partitions of the bucket instead, which are verified without enumerating their pairs up front.'''
+
+    __slots__ = ("bucket", "pairs", "partitions", "cost")
+
+    def __init__(self, bucket: Hashable, partitions: List[List[int]] = None):
+        self.bucket = bucket
+        self.pairs:List[Tuple[int,int]] = []
+        self.partitions = partitions
+        # estimated cost of verifying all the pairs
+        self.cost = 0
+
+    def tableIds(self) -> List[int]:
+        '''Returns the ids of all the tables of the batch in ascending order.'''
+        if(self.partitions is not None): return sorted(tableId for partition in self.partitions for tableId in partition)
+        return sorted({tableId for pair in self.pairs for tableId in pair})
+
+def tableCost(table: dict) -> int:
+    '''Estimates the cost of comparing the given table: rows × cols.'''
+    if(len(table) == 0): return 1
+    return len(table) * max(1, len(table[0]))
+
+def pairBatches(buckets: Dict[Hashable,list], data: dict, workers: int, partitionSize: int = None, partition: Callable[[list], List[list]] = None) -> List[PairBatch]:
+    '''Splits the pairs of tables (tableId1 < tableId2) of every bucket into batches, in the same order as comparing every table with every other table of each bucket.
+    Buckets with at least 'partitionSize' tables (None: no bucket) are split into partitions by 'partition' (default: a single partition) instead,...
+    ...which are put into batches as a whole in the order of the buckets.'''
+
+    costs = dict()
+    for bucket in buckets:
+        for tableId in buckets[bucket]:
+            if tableId not in costs:
+                costs[tableId] = tableCost(data[tableId])
+
+    # the total cost is calculated from the sizes of the buckets first, so no pair has to be created twice
+    totalCost = 0
+    for bucket in buckets:
+        bucketCost = sum(costs[tableId] for tableId in buckets[bucket])
+        if(partitionSize is not None and len(buckets[bucket]) >= partitionSize): totalCost += bucketCost
+        else: totalCost += bucketCost * (len(buckets[bucket]) - 1)
+    limit = max(1, totalCost // max(1, workers * batchesPerWorker))
+
+    batches = []
+    for bucket in buckets:
+        if(partitionSize is not None and len(buckets[bucket]) >= partitionSize):
+            batch = PairBatch(bucket, [])
+            for tablePartition in (partition(buckets[bucket]) if partition is not None else [list(buckets[bucket])]):
+                batch.partitions.append(tablePartition)
+                # every table is mostly compared with a few other tables (e.g. the representatives of the classes of duplicates)
+                batch.cost += sum(costs[tableId] for tableId in tablePartition)
+                if(batch.cost >= limit):
+                    batches.append(batch)
+                    batch = PairBatch(bucket, [])
+            if(len(batch.partitions) > 0): batches.append(batch)
+            continue
+
+        batch = PairBatch(bucket)
+        for tableIdt1 in buckets[bucket]:
+            for tableIdt2 in buckets[bucket]:
+                if tableIdt1 < tableIdt2:
+                    batch.pairs.append((tableIdt1, tableIdt2))
+                    batch.cost += costs[tableIdt1] + costs[tableIdt2]
+                    if(batch.cost >= limit):
+                        batches.append(batch)
+                        batch = PairBatch(bucket)
+        if(len(batch.pairs) > 0): batches.append(batch)
+
+    return batches
+
+def workerCount(workers: int = None) -> int:
+    '''Returns the amount of processes used for the given amount of workers (None: one per cpu).'''
+    return workers or os.cpu_count() or 1
+
+def runBatches(batches: List[PairBatch], function: Callable, payload: Callable[[PairBatch], tuple], workers: int = None) -> list:
+    '''Executes "function(batch.pairs, *payload(batch))" for every batch using 'workers' processes (default: one per cpu).
+    Returns the results in the order of the given batches.'''
+
+    workers = workerCount(workers)
+    # longest processing time first
+    order = sorted(range(len(batches)), key=lambda i: batches[i].cost, reverse=True)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = dict()
+        for i in order:
+            futures[i] = executor.submit(function, batches[i].pairs, *payload(batches[i]))
+        return [futures[i].result() for i in range(len(batches))]
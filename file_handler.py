@@ -0,0 +1,115 @@
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import os
+from typing import List
+
+import Logger
+from table_store import TableStore
+
+loggerActive = False
+
+#####################################################################################################################################################################################
+# offline version: retrieving test data from files instead of a database
+# the results have the same structure as the ones of the loaders in db_handler, so all the deduplicators work without a database
+# the files are parsed in parallel by a pool of processes
+
+#####################################################################################################################################################################################
+# directories of CSV/TSV files: every file contains one table, every line of the file is one row
+# the tableids are the names of the files if all of them are distinct numbers (e.g. "42.csv"), otherwise the positions of the files in the sorted directory
+
+tableFileExtensions = {".csv": ",", ".tsv": "\t"}
+
+def __parseTableFile(path: str) -> List[List[str]]:
+    """Parses a single CSV/TSV file into a list of rows, each being a list of cell values."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return [row for row in csv.reader(f, delimiter=tableFileExtensions[os.path.splitext(path)[1].lower()])]
+
+def __tableIds(fileNames: List[str]) -> List[int]:
+    """Returns the tableids of the given sorted file names: their names if all of them are distinct numbers, otherwise their positions."""
+
+    stems = [os.path.splitext(fileName)[0] for fileName in fileNames]
+    # "1.csv" and "1.tsv" or "001.csv" and "1.csv" would be the same table, so the names are only used if no two of them are the same number
+    if(all(stem.isdecimal() for stem in stems)):
+        tableIds = [int(stem) for stem in stems]
+        if(len(set(tableIds)) == len(tableIds)): return tableIds
+    return list(range(len(fileNames)))
+
+def retrieveTestDataFromDirectory(path: str, workers: int = None, compact: bool = False) -> dict:
+    """Retrieves all the tables of the CSV/TSV files of the given directory and stores them into a dict with a multidimensional index.
+    The files are parsed by 'workers' processes (default: one per cpu).
+    If 'compact' is set, the tables are stored into a TableStore instead."""
+
+    fileNames = sorted(fileName for fileName in os.listdir(path) if os.path.splitext(fileName)[1].lower() in tableFileExtensions)
+    tableIds = __tableIds(fileNames)
+
+    # parsing the tables in the order of their ids keeps the result ordered just like the results of the queries
+    order = sorted(range(len(fileNames)), key=lambda position: tableIds[position])
+    paths = [os.path.join(path, fileNames[position]) for position in order]
+
+    allTables = TableStore() if compact else defaultdict(lambda: defaultdict(dict))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for position, rows in zip(order, executor.map(__parseTableFile, paths, chunksize=max(1, len(paths) // (4 * (workers or os.cpu_count() or 1))))):
+            tableid = tableIds[position]
+            for rowid in range(len(rows)):
+                for colid in range(len(rows[rowid])):
+                    if(compact): allTables.appendCell(tableid, rowid, colid, rows[rowid][colid])
+                    else: allTables[tableid][rowid][colid] = rows[rowid][colid]
+
+    if(loggerActive): Logger.log("Retrieved and structured Testdata!")
+    return allTables
+
+#####################################################################################################################################################################################
+# Parquet datasets: the tupels are stored in the same format as in the corpora of the database
+# columns:  tableid, rowid, colid, tokenized (and super_key as binary string, if super keys are retrieved)
+# a dataset is either a single file or a directory of files, which are parsed in parallel
+# every table has to be contained in a single file
+
+def __parseParquetFile(path: str, withSuperKeys: bool) -> List[tuple]:
+    """Parses a single Parquet file into a list of tupels '(tableid, rowid, colid, token[, super_key])' ordered by tableid, rowid and colid."""
+
+    # only needed for Parquet datasets
+    import pyarrow.parquet
+
+    columns = ["tableid", "rowid", "colid", "tokenized", "super_key"] if withSuperKeys else ["tableid", "rowid", "colid", "tokenized"]
+    table = pyarrow.parquet.read_table(path, columns=columns).to_pydict()
+
+    if(withSuperKeys):
+        rows = [(row[0], row[1], row[2], str(row[3]), int(row[4],2)) for row in zip(*[table[column] for column in columns])]
+    else:
+        rows = [(row[0], row[1], row[2], str(row[3])) for row in zip(*[table[column] for column in columns])]
+
+    rows.sort(key=lambda row: (row[0], row[1], row[2]))
+    return rows
+
+def retrieveTestDataFromParquet(path: str, withSuperKeys: bool = False, workers: int = None, compact: bool = False) -> dict:
+    """Retrieves all the tupels of the given Parquet dataset and stores them into a dict with a multidimensional index.
+    The files of the dataset are parsed by 'workers' processes (default: one per cpu).
+    If 'withSuperKeys' is set, the super keys are retrieved also and '[data, superKeys]' is returned.
+    If 'compact' is set, the tables are stored into a TableStore instead."""
+
+    if(os.path.isdir(path)):
+        paths = sorted(os.path.join(path, fileName) for fileName in os.listdir(path) if fileName.endswith(".parquet"))
+    else:
+        paths = [path]
+
+    # all the tokens for each cell are stored here
+    allTablesData = defaultdict(lambda: defaultdict(dict))
+    # all the Super Keys for each row are stored here
+    allTablesSuperKey = defaultdict(lambda: defaultdict(dict))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for rows in executor.map(__parseParquetFile, paths, [withSuperKeys] * len(paths)):
+            for row in rows:
+                allTablesData[row[0]][row[1]][row[2]] = row[3]
+                if(withSuperKeys): allTablesSuperKey[row[0]][row[1]] = row[4]
+
+    if(compact):
+        # the files may contain the tables in any order, but a TableStore has to be filled ordered by tableid
+        allTablesData = TableStore.fromTables({tableid: allTablesData[tableid] for tableid in sorted(allTablesData)},
+                                              {tableid: allTablesSuperKey[tableid] for tableid in allTablesSuperKey} if withSuperKeys else None)
+        if(withSuperKeys): allTablesSuperKey = allTablesData.superKeyView()
+
+    if(loggerActive): Logger.log("Retrieved and structured Testdata!")
+    return [allTablesData, allTablesSuperKey] if withSuperKeys else allTablesData
@@ -0,0 +1,197 @@
+from collections import Counter
+from functools import lru_cache
+import hashlib
+import re
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+#####################################################################################################################################################################################
+# batch hashing: many table strings are hashed at once instead of one character at a time
+# the results are exactly the same as the ones of the hash functions in index.py
+
+FNV1_64_INIT = 0xcbf29ce484222325
+FNV_64_PRIME = 0x100000001b3
+FNV_64_MASK = 0xffffffffffffffff
+
+# maximum amount of characters of the strings hashed together at the same time
+fnvBatchChars = 1 << 22
+# groups with less strings are hashed one after another, since a vectorized step is only cheaper if it processes enough strings
+fnvMinGroupSize = 8
+
+def fnv1_64bit_single(data:str)->int:
+    '''Hashes the given string using the 64 bit fnv1 algorithm (just like 'index.fnv1_64bit' but without a modulo per character).'''
+    hash = FNV1_64_INIT
+    for code in map(ord, data):
+        hash = ((hash * FNV_64_PRIME) & FNV_64_MASK) ^ code
+    return hash
+
+def fnv1_64bit_batch(data:List[str])->List[int]:
+    '''Hashes all the given strings using the 64 bit fnv1 algorithm and returns the hashes in the same order.
+    The strings are hashed in lockstep: every step multiplies and XORs the next character of all the strings at once.
+    Just like 'index.fnv1_64bit' every character is hashed by its code point (not by its utf-8 bytes).'''
+
+    hashes = [FNV1_64_INIT] * len(data)
+
+    # the longest strings first, so the strings still being hashed are always the first ones of a group
+    order = sorted(range(len(data)), key=lambda i: len(data[i]), reverse=True)
+    prime = np.uint64(FNV_64_PRIME)
+
+    start = 0
+    while start < len(order):
+        maxLen = len(data[order[start]])
+        if(maxLen == 0): break # all the remaining strings are empty
+
+        # a group contains as many strings as fit into the character budget with the length of its longest string
+        groupSize = max(1, min(len(order) - start, fnvBatchChars // maxLen))
+        group = order[start:start + groupSize]
+        start += groupSize
+
+        if(groupSize < fnvMinGroupSize):
+            for i in group:
+                hashes[i] = fnv1_64bit_single(data[i])
+            continue
+
+        # one column per string, one row per character position (utf-32 code points)
+        codes = np.zeros((groupSize, maxLen), dtype=np.uint32)
+        lengths = np.empty(groupSize, dtype=np.int64)
+        for k in range(groupSize):
+            string = data[group[k]]
+            lengths[k] = len(string)
+            codes[k, :len(string)] = np.frombuffer(string.encode("utf-32-le"), dtype=np.uint32)
+        codes = np.ascontiguousarray(codes.T)
+
+        groupHashes = np.full(groupSize, FNV1_64_INIT, dtype=np.uint64)
+        # amount of strings, which are at least as long as the current position
+        active = groupSize
+        for position in range(maxLen):
+            while lengths[active - 1] <= position:
+                active -= 1
+            # uint64 arithmetic wraps around, which is exactly the modulo 2**64
+            groupHashes[:active] *= prime
+            groupHashes[:active] ^= codes[position, :active]
+
+        for k in range(groupSize):
+            hashes[group[k]] = int(groupHashes[k])
+
+    return hashes
+
+#####################################################################################################################################################################################
+# incremental hashing: the hashes are calculated from a stream of chunks (see 'serializer.py') without joining them into one string
+# the results are exactly the same as the ones of hashing the joined string
+
+def fnv1_64bit_stream(chunks:Iterable[str])->int:
+    '''Hashes the string formed by the given chunks using the 64 bit fnv1 algorithm.'''
+    hash = FNV1_64_INIT
+    for chunk in chunks:
+        for code in map(ord, chunk):
+            hash = ((hash * FNV_64_PRIME) & FNV_64_MASK) ^ code
+    return hash
+
+# the features of the simhash library: all the substrings of 'SIMHASH_WIDTH' characters of the lowercase text...
+# ...after removing every character, which does not match 'SIMHASH_PATTERN'
+SIMHASH_PATTERN = re.compile(r'[\w\u4e00-\u9fcc]+')
+SIMHASH_WIDTH = 4
+
+def simhash_features_stream(chunks:Iterable[str])->Dict[str,int]:
+    '''Extracts the same weighted features as the simhash library from the string formed by the given chunks: feature -> weight.'''
+
+    features:Dict[str,int] = Counter()
+    # the last characters of the previous chunks, which form features together with the next chunk
+    tail = ""
+    length = 0
+
+    for chunk in chunks:
+        content = tail + "".join(SIMHASH_PATTERN.findall(chunk.lower()))
+        length += len(content) - len(tail)
+        features.update([content[i:i + SIMHASH_WIDTH] for i in range(len(content) - SIMHASH_WIDTH + 1)])
+        tail = content[-(SIMHASH_WIDTH - 1):] if len(content) >= SIMHASH_WIDTH - 1 else content
+
+    # texts shorter than the width form a single feature
+    if(length < SIMHASH_WIDTH): features[tail] = 1
+    return features
+
+@lru_cache(maxsize=1 << 20)
+def simhash_feature_digest(feature:str)->bytes:
+    '''Returns the md5 hash of the given feature (cached, since the same features appear in many tables).'''
+    return hashlib.md5(feature.encode("utf-8")).digest()
+
+def simhash_from_features(features:Dict[str,int], bits:int)->int:
+    '''Calculates the simhash of the given weighted features exactly like the simhash library does (md5 hashes of the features).'''
+
+    byteCount = bits // 8
+    digests = b"".join(simhash_feature_digest(feature)[-byteCount:] for feature in features)
+    weights = np.fromiter(features.values(), dtype=np.int64, count=len(features))
+
+    # every bit is set, if it is set in the hashes of more than half of the (weighted) features
+    bitMatrix = np.unpackbits(np.frombuffer(digests, dtype=np.uint8)).reshape(len(features), bits)
+    sums = weights @ bitMatrix
+    return int.from_bytes(np.packbits(sums > weights.sum() / 2).tobytes(), "big")
+
+def simhash_stream(chunks:Iterable[str], bits:int)->int:
+    '''Hashes the string formed by the given chunks using the simhash algorithm.'''
+    return simhash_from_features(simhash_features_stream(chunks), bits)
+
+# maximum amount of features of the strings hashed together by 'simhash_batch', their bits are accumulated at the same time
+simhashBatchFeatures = 1 << 15
+
+def simhash_batch(data:List[str], bits:int)->List[int]:
+    '''Hashes all the given strings using the simhash algorithm and returns the hashes in the same order.
+    The features of many strings are hashed (with a cache) and their weighted bits are accumulated at once,...
+    ...instead of creating a Simhash object for every string. The hashes are the same as the ones of the simhash library.'''
+
+    byteCount = bits // 8
+    hashes = []
+
+    position = 0
+    while position < len(data):
+        digests = []
+        weights = []
+        # position of the first feature of every string (and the end of the last string)
+        starts = [0]
+
+        # every string has at least one feature, so every batch contains at least one string
+        while position < len(data) and starts[-1] < simhashBatchFeatures:
+            features = simhash_features_stream((data[position],))
+            digests.extend(map(simhash_feature_digest, features))
+            weights.extend(features.values())
+            starts.append(starts[-1] + len(features))
+            position += 1
+
+        # only the last bytes of the md5 hashes are used, just like in the simhash library
+        digestMatrix = np.frombuffer(b"".join(digests), dtype=np.uint8).reshape(len(digests), 16)[:, 16 - byteCount:]
+        # float64 sums of integers are exact and a lot faster than integer sums
+        bitMatrix = np.unpackbits(digestMatrix, axis=1).astype(np.float64)
+        weightArray = np.array(weights, dtype=np.float64)
+
+        for i in range(len(starts) - 1):
+            stringWeights = weightArray[starts[i]:starts[i + 1]]
+            # every bit is set, if it is set in the hashes of more than half of the (weighted) features
+            sums = stringWeights @ bitMatrix[starts[i]:starts[i + 1]]
+            hashes.append(int.from_bytes(np.packbits(sums > stringWeights.sum() / 2).tobytes(), "big"))
+
+    return hashes
+
+#####################################################################################################################################################################################
+# order invariant fingerprints: tables are hashed directly instead of via a sorted string representation
+# every cell is hashed, the cells of a row are combined by a sum (order of the columns is irrelevant) and the distinct rows are combined by another sum...
+# ...of their mixed hashes (order and duplicates of the rows are irrelevant), so tables being duplicates of the type 2+3+4 always share a fingerprint
+
+@lru_cache(maxsize=1 << 20)
+def multiset_cell_hash(cell:str)->int:
+    '''Hashes a single cell value to 64 bits (cached, since the same values appear in many tables).'''
+    return int.from_bytes(hashlib.blake2b(cell.encode("utf-8"), digest_size=8).digest(), "little")
+
+def splitmix64(value:int)->int:
+    '''Mixes the bits of the given 64 bit value (finalizer of the splitmix64 generator).
+    Without mixing, the sum of the rows would only be the sum of all the cells and thus ignore which cells share a row.'''
+    value = ((value ^ (value >> 30)) * 0xbf58476d1ce4e5b9) & FNV_64_MASK
+    value = ((value ^ (value >> 27)) * 0x94d049bb133111eb) & FNV_64_MASK
+    return value ^ (value >> 31)
+
+def multiset_fingerprint(table:dict)->int:
+    '''Calculates the 64 bit order invariant fingerprint of the given table in linear time.'''
+    rowHashes = set()
+    for rowid in table:
+        rowHashes.add(splitmix64(sum(map(multiset_cell_hash, table[rowid].values())) & FNV_64_MASK))
+    return sum(rowHashes) & FNV_64_MASK
@@ -1,9 +1,19 @@
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from enum import Enum
-from typing import Callable, Dict, List
+from itertools import repeat
+import os
+from typing import Callable, Dict, Iterable, Iterator, List
 
 from simhash import Simhash
 
+import memory_handler
+import hash_engine
+import serializer
+import shared_corpus
+from hash_engine import FNV1_64_INIT, FNV_64_PRIME
+
 
 
 def preprocessData(allTables: defaultdict) -> defaultdict:
@@ -170,6 +180,13 @@ class ToStringVersion(Enum):
         elif(self == ToStringVersion.INDENT): return toString_indent(table)
         elif(self == ToStringVersion.FULL): return toString_full(table)
         else: raise TypeError("The current type %s is not supported!"%self)
+    
+    def stream(self, table:List[list])->Iterator[str]:
+        '''Streams the same string as 'execute' as chunks (see 'serializer.py').'''
+        if(self == ToStringVersion.SIMPLE): return serializer.stream_simple(table)
+        elif(self == ToStringVersion.INDENT): return serializer.stream_indent(table)
+        elif(self == ToStringVersion.FULL): return serializer.stream_full(table)
+        else: raise TypeError("The current type %s is not supported!"%self)
         
         
     
@@ -178,8 +195,6 @@ def simhash(data:str, bits:int=BITS):
     '''Hashes the given string using the simhash algorithm.'''
     return Simhash(data, f=bits).value
 
-FNV1_64_INIT = 0xcbf29ce484222325
-FNV_64_PRIME = 0x100000001b3
 def fnv1_64bit(data:str)->int:
     '''Hashes the given string using the 64 bit fnv1 algorithm.'''
     hash = FNV1_64_INIT
@@ -195,36 +210,77 @@ class HashVersion(Enum):
     SIMILARITY_64_BIT:str = "simhash 64 bit"
     SIMILARITY_128_BIT:str = "simhash 128 bit"
     FNV1:str = "fnv1-hash"
+    MULTISET:str = "multiset-hash"
     
     def execute(self, data:str)->int:
         if(self == HashVersion.SIMILARITY_64_BIT): return simhash(data, 64)
         elif(self == HashVersion.SIMILARITY_128_BIT): return simhash(data, 128)
         elif(self == HashVersion.FNV1): return fnv1_64bit(data)
+        elif(self == HashVersion.MULTISET): raise TypeError("The type %s hashes tables, not strings (see 'executeTable')!"%self)
+        else: raise TypeError("The current type %s is not supported!"%self)
+    
+    def executeTable(self, table:dict)->int:
+        '''Hashes the given table directly, without a string representation.'''
+        if(self == HashVersion.MULTISET): return hash_engine.multiset_fingerprint(table)
+        else: raise TypeError("The type %s hashes strings, not tables (see 'execute')!"%self)
+    
+    def executeStream(self, chunks:Iterable[str])->int:
+        '''Hashes the string formed by the given chunks without joining them, returns the same hash as 'execute'.'''
+        if(self == HashVersion.SIMILARITY_64_BIT): return hash_engine.simhash_stream(chunks, 64)
+        elif(self == HashVersion.SIMILARITY_128_BIT): return hash_engine.simhash_stream(chunks, 128)
+        elif(self == HashVersion.FNV1): return hash_engine.fnv1_64bit_stream(chunks)
         else: raise TypeError("The current type %s is not supported!"%self)
     
+    def executeBatch(self, data:List[str])->List[int]:
+        '''Hashes all the given strings at once, returns the same hashes as 'execute' in the same order.'''
+        if(self == HashVersion.SIMILARITY_64_BIT): return hash_engine.simhash_batch(data, 64)
+        elif(self == HashVersion.SIMILARITY_128_BIT): return hash_engine.simhash_batch(data, 128)
+        elif(self == HashVersion.FNV1): return hash_engine.fnv1_64bit_batch(data)
+        else: return [self.execute(string) for string in data]
+    
+# amount of tables hashed at once by 'create_exact' and 'create_fuzzy'
+hashBatchSize:int = 1000
+# whether the tables are hashed from streams of chunks instead of whole strings (less memory for big tables)
+streamingSerialization:bool = False
+
 def create_exact(data:dict, strFunc:ToStringVersion=ToStringVersion.FULL, hashFunc:HashVersion=HashVersion.SIMILARITY_64_BIT)->Dict[int,list]:
-    '''Creates and returns an index mapping of Simhash Buckets containing respective table IDs: simhash -> [tableIds...].'''
+    '''Creates and returns an index mapping of Simhash Buckets containing respective table IDs: simhash -> [tableIds...].
+    The 'MULTISET' hash is order invariant itself, so it neither needs the preprocessing nor 'strFunc'.'''
     
     # preprocessing to ensure perfect recall
-    data = preprocessData(data)
+    if(hashFunc != HashVersion.MULTISET):
+        data = preprocessData(data)
+        if memory_handler.collectMemory: memory_handler.record_size("preprocessed data", data)
     
     # buckets of hash values containing respective table ids
     hashMap:Dict[int:list] = dict()
     
-    for tableId in data:
+    # the tables are hashed in batches, so only the strings of one batch exist at the same time
+    tableIds = list(data)
+    for batchStart in range(0, len(tableIds), hashBatchSize):
+        batchIds = tableIds[batchStart:batchStart + hashBatchSize]
 
         #tableString = dataframes[tableId].to_string()
 
         # create hash of the table via a string representation
-        tableString = strFunc.execute(data[tableId])
-        hash = hashFunc.execute(tableString)
+        if(hashFunc == HashVersion.MULTISET):
+            # just like the preprocessing, leave out the tables without any cells
+            batchIds = [tableId for tableId in batchIds if any(len(data[tableId][rowid]) > 0 for rowid in data[tableId])]
+            hashes = [hashFunc.executeTable(data[tableId]) for tableId in batchIds]
+        elif(streamingSerialization):
+            hashes = [hashFunc.executeStream(strFunc.stream(data[tableId])) for tableId in batchIds]
+        else:
+            tableStrings = [strFunc.execute(data[tableId]) for tableId in batchIds]
+            hashes = hashFunc.executeBatch(tableStrings)
         
-        # create a bucket for the simhash if not already present
-        if hash not in hashMap:
-            hashMap[hash] = []
-            
-        hashMap[hash].append(tableId)
+        for tableId, hash in zip(batchIds, hashes):
+            # create a bucket for the simhash if not already present
+            if hash not in hashMap:
+                hashMap[hash] = []
+                
+            hashMap[hash].append(tableId)
     
+    if memory_handler.collectMemory: memory_handler.record_size("hash index", hashMap)
     return hashMap
 
 def create_fuzzy(data:dict, strFunc:ToStringVersion=ToStringVersion.FULL, alreadyPreprocessed:bool=False)->Dict[int,int]:
@@ -233,18 +289,81 @@ def create_fuzzy(data:dict, strFunc:ToStringVersion=ToStringVersion.FULL, alread
     # preprocessing to ensure perfect recall
     if(not alreadyPreprocessed):
         data = preprocessData(data)
+        if memory_handler.collectMemory: memory_handler.record_size("preprocessed data", data)
     
     # buckets of hash values containing respective table ids
     hashMap:Dict[int:list] = dict()
     
-    for tableId in data:
+    # the tables are hashed in batches, so only the strings of one batch exist at the same time
+    tableIds = list(data)
+    for batchStart in range(0, len(tableIds), hashBatchSize):
+        batchIds = tableIds[batchStart:batchStart + hashBatchSize]
         
         # create hash of the table via a string representation
-        tableString = strFunc.execute(data[tableId])
-        hash = HashVersion.SIMILARITY_128_BIT.execute(tableString)
+        if(streamingSerialization):
+            hashes = [HashVersion.SIMILARITY_128_BIT.executeStream(strFunc.stream(data[tableId])) for tableId in batchIds]
+        else:
+            tableStrings = [strFunc.execute(data[tableId]) for tableId in batchIds]
+            hashes = HashVersion.SIMILARITY_128_BIT.executeBatch(tableStrings)
         
         # mapping hashes onto table IDs
-        hashMap[tableId] = hash
+        for tableId, hash in zip(batchIds, hashes):
+            hashMap[tableId] = hash
+    
+    if memory_handler.collectMemory: memory_handler.record_size("hash index", hashMap)
+    return hashMap
+    
+
+#####################################################################################################################################################################################
+# parallel versions: the tables are split into contiguous shards, which are preprocessed, serialized and hashed by a pool of processes
+# the tables are published into shared memory once (see 'shared_corpus'), so the processes only receive the ids of the tables of their shards
+# the results of the shards are merged in the order of the shards, so they are exactly the same as the ones of the serial versions
+# (including the order of the buckets and of the table ids in every bucket)
+
+# amount of shards per process, more shards balance the work better if some tables are a lot bigger than others
+shardsPerWorker:int = 4
+
+def __shards(data:dict, workers:int)->List[List[int]]:
+    '''Splits the ids of the given tables into contiguous shards.'''
+    
+    tableIds = list(data)
+    shardCount = max(1, min(len(tableIds), workers * shardsPerWorker))
+    shardSize = -(-len(tableIds) // shardCount)
+    return [tableIds[start:start + shardSize] for start in range(0, len(tableIds), shardSize)]
+
+def __createExactShard(data, strFunc:ToStringVersion, hashFunc:HashVersion)->Dict[int,list]:
+    return create_exact(shared_corpus.resolve(data), strFunc, hashFunc)
+
+def __createFuzzyShard(data, strFunc:ToStringVersion, alreadyPreprocessed:bool)->Dict[int,int]:
+    return create_fuzzy(shared_corpus.resolve(data), strFunc, alreadyPreprocessed)
+
+def create_exact_parallel(data:dict, strFunc:ToStringVersion=ToStringVersion.FULL, hashFunc:HashVersion=HashVersion.SIMILARITY_64_BIT, workers:int=None, corpus=None)->Dict[int,list]:
+    '''Creates the same index as 'create_exact' using 'workers' processes (default: one per cpu): simhash -> [tableIds...].
+    The tables are read from the given published corpus (see 'shared_corpus.publish'), if there is none they are published here.'''
+    
+    workers = workers or os.cpu_count() or 1
+    hashMap:Dict[int:list] = dict()
+    
+    with shared_corpus.publish(data) if corpus is None else nullcontext(corpus) as corpus:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for shardMap in executor.map(__createExactShard, [corpus.select(shard) for shard in __shards(data, workers)], repeat(strFunc), repeat(hashFunc)):
+                for hash in shardMap:
+                    if hash not in hashMap:
+                        hashMap[hash] = []
+                    hashMap[hash].extend(shardMap[hash])
+    
+    return hashMap
+
+def create_fuzzy_parallel(data:dict, strFunc:ToStringVersion=ToStringVersion.FULL, alreadyPreprocessed:bool=False, workers:int=None, corpus=None)->Dict[int,int]:
+    '''Creates the same index as 'create_fuzzy' using 'workers' processes (default: one per cpu): tableId -> simhash.
+    The tables are read from the given published corpus (see 'shared_corpus.publish'), if there is none they are published here.'''
+    
+    workers = workers or os.cpu_count() or 1
+    hashMap:Dict[int:list] = dict()
+    
+    with shared_corpus.publish(data) if corpus is None else nullcontext(corpus) as corpus:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for shardMap in executor.map(__createFuzzyShard, [corpus.select(shard) for shard in __shards(data, workers)], repeat(strFunc), repeat(alreadyPreprocessed)):
+                hashMap.update(shardMap)
     
     return hashMap
-    
\ No newline at end of file
@@ -0,0 +1,110 @@
+import sys
+import types
+import tracemalloc
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict
+
+import Logger
+
+# whether the stages of the loaders and deduplicators record their memory usage
+# walking big datastructures takes time, so this is only meant for memory experiments
+collectMemory = False
+
+# stage name -> amount of bytes used by the stage
+memoryStats:Dict[str,int] = dict()
+# stage name -> highest amount of bytes allocated at the same time during the stage
+peakStats:Dict[str,int] = dict()
+
+# objects, that are not part of the data itself
+__ignoredTypes = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType, types.CodeType)
+# objects, that do not reference other objects
+__leafTypes = (str, bytes, bytearray, int, float, complex, bool, array, memoryview, type(None))
+
+def deep_sizeof(obj)->int:
+    '''Calculates the amount of bytes of the given object including all the objects it references.
+    Every object is only counted once, no matter how often it is referenced.'''
+
+    seen = set()
+    stack = [obj]
+    size = 0
+
+    while stack:
+        current = stack.pop()
+        if(id(current) in seen): continue
+        seen.add(id(current))
+
+        if(isinstance(current, __ignoredTypes)): continue
+        size += sys.getsizeof(current)
+
+        if(isinstance(current, __leafTypes)): continue
+        if(isinstance(current, dict)):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif(isinstance(current, (list, tuple, set, frozenset, deque))):
+            stack.extend(current)
+        else:
+            # attributes of custom objects
+            if(hasattr(current, "__dict__")): stack.append(current.__dict__)
+            for cls in type(current).__mro__:
+                for slot in getattr(cls, "__slots__", ()):
+                    if(hasattr(current, slot)): stack.append(getattr(current, slot))
+
+    return size
+
+def add_size(name:str, size:int):
+    '''Adds the given amount of bytes to the given stage.'''
+    memoryStats[name] = memoryStats.get(name, 0) + size
+
+def record_size(name:str, obj)->int:
+    '''Adds the deep size of the given object to the given stage and returns it.'''
+    size = deep_sizeof(obj)
+    add_size(name, size)
+    return size
+
+def get_memory(name:str)->int:
+    '''Returns the amount of bytes recorded for the given stage.'''
+    return memoryStats.get(name, 0)
+
+def get_peak(name:str)->int:
+    '''Returns the highest amount of bytes allocated at the same time during the given stage (see 'measure_memory').'''
+    return peakStats.get(name, 0)
+
+def clear_stats():
+    '''Removes all the recorded stages.'''
+    memoryStats.clear()
+    peakStats.clear()
+
+def log_stats():
+    '''Logs all the recorded stages.'''
+    for name in memoryStats:
+        Logger.log("%s: %s MB"%(name, round(memoryStats[name] / 1024 / 10.24) / 100))
+    for name in peakStats:
+        Logger.log("%s (peak): %s MB"%(name, round(peakStats[name] / 1024 / 10.24) / 100))
+
+@contextmanager
+def measure_memory(name):
+    '''Measures the memory the context allocates using tracemalloc.
+    The memory still allocated after the context is added to the stage, the highest amount allocated at the same time is stored as its peak.
+    Nested measurements reset the peak of the outer measurement.'''
+
+    startedTracing = not tracemalloc.is_tracing()
+    if(startedTracing): tracemalloc.start()
+
+    # measure memory beforehand
+    memoryBefore = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+
+    try:
+        # process context
+        yield
+    finally:
+        # calculate memory results
+        memoryAfter, peak = tracemalloc.get_traced_memory()
+        if(startedTracing): tracemalloc.stop()
+
+        add_size(name, memoryAfter - memoryBefore)
+        peakStats[name] = max(peakStats.get(name, 0), peak - memoryBefore)
+
+        Logger.log("%s: Memory: '%s' MB and Peak: '%s' MB"%(name, round((memoryAfter - memoryBefore) / 1024 / 10.24) / 100, round((peak - memoryBefore) / 1024 / 10.24) / 100))
@@ -1,10 +1,17 @@
-from typing import Set
+from typing import Dict, Set
+import os
+import time
 import psycopg2
 
 import Logger
 import time_handler
+import memory_handler
 import db_handler as db
+import snapshot_cache
+import file_handler
 import index
+import hash_engine
+from candidate_engine import CandidateEngine
 
 import deduplicators.hash_xash_deduplicator as hxdd
 import deduplicators.deduplicator as dedup
@@ -12,13 +19,14 @@ import deduplicators.deduplicator as dedup
 defaultSmallerRanges:list = [10000,20000,30000,40000,50000]
 defaultBiggerRanges:list = [10000, 20000, 30000, 40000, 50000, 60000, 70000, 80000, 90000, 100000]
 
-def run_default_tests(conn, offset:int = 0, reps:int = 3, slowerAlgRanges:list = defaultSmallerRanges, fasterAlgRanges:list = defaultBiggerRanges):
+def run_default_tests(conn, offset:int = 0, reps:int = 3, slowerAlgRanges:list = defaultSmallerRanges, fasterAlgRanges:list = defaultBiggerRanges, useSnapshots:bool = False):
     '''Executes a performance test of the algorithms developed in this thesis.
         "conn": the connection this test uses to retrieve the data from.
         "offset" an offset added to all id's retrieved.
         "reps": the amount of repretitions for each singular test.
         "slowerAlgRanges": the ranges of tables used to test slower algorithms like XASH-dedup.
-        "fasterAlgRanges": the ranges of tables used to test faster algorithms like fnv1-dedup.'''
+        "fasterAlgRanges": the ranges of tables used to test faster algorithms like fnv1-dedup.
+        "useSnapshots": whether the data is loaded from local snapshots, which are only created from "conn" if they are missing.'''
     
     # first execute all the slower algorithms
     if(slowerAlgRanges != None):
@@ -26,7 +34,8 @@ def run_default_tests(conn, offset:int = 0, reps:int = 3, slowerAlgRanges:list =
         # xash test
         Logger.log("XASH Test:")
         for tableAmount in slowerAlgRanges:
-            tableDictWithSuperKeys = db.retrieveTestDataWithSuperKeysIdRange(conn, offset, offset+tableAmount)
+            if(useSnapshots): tableDictWithSuperKeys = snapshot_cache.retrieveTestDataWithSuperKeysIdRange(conn, offset, offset+tableAmount)
+            else: tableDictWithSuperKeys = db.retrieveTestDataWithSuperKeysIdRange(conn, offset, offset+tableAmount)
             
             Logger.log("%s tables:"%tableAmount)
             
@@ -40,7 +49,8 @@ def run_default_tests(conn, offset:int = 0, reps:int = 3, slowerAlgRanges:list =
         # simhash 64 bit test
         Logger.log("Simhash 64 bit Test:")
         for tableAmount in slowerAlgRanges:
-            tableDict = db.retrieveTestDataIdRange(conn, db.CorpusType.MATE_MAIN, offset, offset+tableAmount)
+            if(useSnapshots): tableDict = snapshot_cache.retrieveTestDataIdRange(conn, db.CorpusType.MATE_MAIN, offset, offset+tableAmount)
+            else: tableDict = db.retrieveTestDataIdRange(conn, db.CorpusType.MATE_MAIN, offset, offset+tableAmount)
             
             # for all possible toString versions
             for strVersion in index.ToStringVersion:
@@ -57,7 +67,8 @@ def run_default_tests(conn, offset:int = 0, reps:int = 3, slowerAlgRanges:list =
     
         # the faster algs are executed in one loop
         for tableAmount in fasterAlgRanges:
-            tableDict = db.retrieveTestDataIdRange(conn, db.CorpusType.MATE_MAIN, offset, offset+tableAmount)
+            if(useSnapshots): tableDict = snapshot_cache.retrieveTestDataIdRange(conn, db.CorpusType.MATE_MAIN, offset, offset+tableAmount)
+            else: tableDict = db.retrieveTestDataIdRange(conn, db.CorpusType.MATE_MAIN, offset, offset+tableAmount)
                     
             # simhash 128 bit test
             for strVersion in index.ToStringVersion:
@@ -77,18 +88,20 @@ def run_default_tests(conn, offset:int = 0, reps:int = 3, slowerAlgRanges:list =
     
     return
 
-def run_special_tests(conn, reps:int = 3, ranges:list = defaultBiggerRanges, corpusList:Set[db.CorpusType] = {db.CorpusType.GIT_TABLES, db.CorpusType.WEB_TABLES}):
+def run_special_tests(conn, reps:int = 3, ranges:list = defaultBiggerRanges, corpusList:Set[db.CorpusType] = {db.CorpusType.GIT_TABLES, db.CorpusType.WEB_TABLES}, useSnapshots:bool = False):
     '''Executes a performance test of the faster algorithms developed in this thesis on different corpi.
     "conn": the connection this test uses to retrieve the data from.
     "reps": the amount of repretitions for each singular test.
     "ranges": the ranges of tables used to test faster algorithms.
-    "corpusList":the different corpi used to test the faster algorithms.'''
+    "corpusList":the different corpi used to test the faster algorithms.
+    "useSnapshots": whether the data is loaded from local snapshots, which are only created from "conn" if they are missing.'''
      
     for corpusType in corpusList:
         Logger.log("Test on corpus %s:\n"%corpusType)
             
         for tableAmount in ranges:
-            tableDict = db.retrieveTestDataIdRange(conn, corpusType, 0, tableAmount)
+            if(useSnapshots): tableDict = snapshot_cache.retrieveTestDataIdRange(conn, corpusType, 0, tableAmount)
+            else: tableDict = db.retrieveTestDataIdRange(conn, corpusType, 0, tableAmount)
             
             Logger.log("\nRunning 128 bit simple simhash with %s tables:"%(tableAmount))
             for rep in range(reps):
@@ -109,4 +122,242 @@ def run_special_tests(conn, reps:int = 3, ranges:list = defaultBiggerRanges, cor
                 duplicatesSet = dedup.deduplicate(tableDict, index.ToStringVersion.SIMPLE, index.HashVersion.FNV1)
                 Logger.log("")
     
-    return
\ No newline at end of file
+    return
+
+def run_loader_tests(conn, offset:int = 0, reps:int = 3, ranges:list = defaultSmallerRanges):
+    '''Compares the cursor based loader with the COPY based bulk loader on the same ranges of the 'MATE_MAIN' corpus.
+    "conn": the connection this test uses to retrieve the data from.
+    "offset" an offset added to all id's retrieved.
+    "reps": the amount of repretitions for each singular test.
+    "ranges": the ranges of tables retrieved by both loaders.'''
+    
+    for tableAmount in ranges:
+        Logger.log("\nLoading %s tables with super keys:"%(tableAmount))
+        for rep in range(reps):
+            Logger.log("%s. measurement:"%(rep+1))
+            
+            with time_handler.measure_time("Cursor loader"):
+                cursorData = db.retrieveTestDataWithSuperKeysIdRange(conn, offset, offset+tableAmount)
+            del cursorData
+            
+            with time_handler.measure_time("COPY loader"):
+                copyData = db.bulkRetrieveTestDataWithSuperKeysIdRange(conn, offset, offset+tableAmount)
+            del copyData
+            
+            Logger.log("")
+    
+    return
+
+def run_memory_tests(conn, offset:int = 0, ranges:list = defaultSmallerRanges) -> Dict[int, Dict[str,int]]:
+    '''Measures the memory used by every stage of loading and deduplicating the given ranges of the 'MATE_MAIN' corpus.
+    Returns the recorded stages for every range: tableAmount -> stage name -> bytes (see 'memory_handler').
+    "conn": the connection this test uses to retrieve the data from.
+    "offset" an offset added to all id's retrieved.
+    "ranges": the ranges of tables used.'''
+    
+    results = dict()
+    collectMemory = memory_handler.collectMemory
+    memory_handler.collectMemory = True
+    
+    try:
+        for tableAmount in ranges:
+            Logger.log("\nMemory usage with %s tables:"%(tableAmount))
+            memory_handler.clear_stats()
+            
+            with memory_handler.measure_memory("loading"):
+                tableDict = db.retrieveTestDataIdRange(conn, db.CorpusType.MATE_MAIN, offset, offset+tableAmount)
+            
+            with memory_handler.measure_memory("deduplication"):
+                duplicatesSet = dedup.deduplicate(tableDict, index.ToStringVersion.SIMPLE, index.HashVersion.FNV1)
+            
+            memory_handler.log_stats()
+            results[tableAmount] = dict(memory_handler.memoryStats)
+            del tableDict
+    finally:
+        memory_handler.collectMemory = collectMemory
+    
+    return results
+
+def run_file_tests(path:str, reps:int = 3, workers:int = None):
+    '''Executes a performance test of the faster algorithms developed in this thesis on tables stored in files instead of a database.
+    "path": a directory of CSV/TSV files or a Parquet dataset (see 'file_handler').
+    "reps": the amount of repretitions for each singular test.
+    "workers": the amount of processes parsing the files.'''
+    
+    with time_handler.measure_time("Loading"):
+        if(os.path.isdir(path) and not any(fileName.endswith(".parquet") for fileName in os.listdir(path))):
+            tableDict = file_handler.retrieveTestDataFromDirectory(path, workers)
+        else:
+            tableDict = file_handler.retrieveTestDataFromParquet(path, workers=workers)
+    
+    Logger.log("\nRunning 128 bit simple simhash with %s tables:"%(len(tableDict)))
+    for rep in range(reps):
+        Logger.log("%s. measurement:"%(rep+1))
+        duplicatesSet = dedup.deduplicate(tableDict, index.ToStringVersion.SIMPLE, index.HashVersion.SIMILARITY_128_BIT)
+        Logger.log("")
+    
+    Logger.log("\nRunning 64 bit simple fnv1 with %s tables:"%(len(tableDict)))
+    for rep in range(reps):
+        Logger.log("%s. measurement:"%(rep+1))
+        duplicatesSet = dedup.deduplicate(tableDict, index.ToStringVersion.SIMPLE, index.HashVersion.FNV1)
+        Logger.log("")
+    
+    return
+
+def run_hash_tests(conn, offset:int = 0, reps:int = 3, ranges:list = defaultSmallerRanges):
+    '''Compares the throughput of the per character fnv1 hash with the batch fnv1 hash engine on the table strings of the 'MATE_MAIN' corpus.
+    "conn": the connection this test uses to retrieve the data from.
+    "offset" an offset added to all id's retrieved.
+    "reps": the amount of repretitions for each singular test.
+    "ranges": the ranges of tables used.'''
+    
+    for tableAmount in ranges:
+        tableDict = index.preprocessData(db.retrieveTestDataIdRange(conn, db.CorpusType.MATE_MAIN, offset, offset+tableAmount))
+        
+        for strVersion in index.ToStringVersion:
+            tableStrings = [strVersion.execute(tableDict[tableId]) for tableId in tableDict]
+            megaBytes = sum(len(tableString.encode("utf-8")) for tableString in tableStrings) / (1024 * 1024)
+            Logger.log("\nHashing %s %s table strings (%s MB):"%(tableAmount, strVersion.value, round(megaBytes * 100) / 100))
+            
+            for rep in range(reps):
+                Logger.log("%s. measurement:"%(rep+1))
+                
+                wallTime = time.time()
+                singleHashes = [index.fnv1_64bit(tableString) for tableString in tableStrings]
+                singleTime = time.time() - wallTime
+                
+                wallTime = time.time()
+                batchHashes = hash_engine.fnv1_64bit_batch(tableStrings)
+                batchTime = time.time() - wallTime
+                
+                if(singleHashes != batchHashes): Logger.log("The hashes of the batch engine differ!")
+                Logger.log("per character: %s MB/s, batch: %s MB/s"%(round(megaBytes / max(singleTime, 1e-9) * 100) / 100, round(megaBytes / max(batchTime, 1e-9) * 100) / 100))
+            
+            Logger.log("")
+    
+    return
+
+def run_multiset_tests(conn, offset:int = 0, reps:int = 3, ranges:list = defaultBiggerRanges):
+    '''Compares the index creation of the order invariant multiset hash with the FULL and SIMPLE string representations on the 'MATE_MAIN' corpus.
+    "conn": the connection this test uses to retrieve the data from.
+    "offset" an offset added to all id's retrieved.
+    "reps": the amount of repretitions for each singular test.
+    "ranges": the ranges of tables used.'''
+    
+    versions = [(index.ToStringVersion.FULL, index.HashVersion.FNV1), (index.ToStringVersion.SIMPLE, index.HashVersion.FNV1), (index.ToStringVersion.SIMPLE, index.HashVersion.MULTISET)]
+    
+    for tableAmount in ranges:
+        tableDict = db.retrieveTestDataIdRange(conn, db.CorpusType.MATE_MAIN, offset, offset+tableAmount)
+        Logger.log("\n%s tables:"%tableAmount)
+        
+        for rep in range(reps):
+            Logger.log("%s. measurement:"%(rep+1))
+            
+            for strVersion, hashVersion in versions:
+                wallTime = time.time()
+                hashMap = index.create_exact(tableDict, strVersion, hashVersion)
+                wallTime = time.time() - wallTime
+                
+                versionString = hashVersion.value if hashVersion == index.HashVersion.MULTISET else "%s %s"%(strVersion.value, hashVersion.value)
+                Logger.log("%s: %s s, %s buckets"%(versionString, round(wallTime * 1000) / 1000, len(hashMap)))
+            
+            Logger.log("")
+    
+    return
+
+def run_candidate_tests(conn, offset:int = 0, reps:int = 3, ranges:list = defaultSmallerRanges, Ks:list = [3, 8, 16, 32]):
+    '''Compares the candidate engines of the fuzzy deduplication on the simhashes of the 'MATE_MAIN' corpus.
+    "conn": the connection this test uses to retrieve the data from.
+    "offset" an offset added to all id's retrieved.
+    "reps": the amount of repretitions for each singular test.
+    "ranges": the ranges of tables used.
+    "Ks": the maximum hamming distances tested.'''
+    
+    for tableAmount in ranges:
+        tableDict = db.retrieveTestDataIdRange(conn, db.CorpusType.MATE_MAIN, offset, offset+tableAmount)
+        hashMap = index.create_fuzzy(tableDict, index.ToStringVersion.FULL)
+        hashes = list(hashMap.values())
+        
+        for K in Ks:
+            Logger.log("\n%s tables with K = %s:"%(tableAmount, K))
+            
+            for rep in range(reps):
+                Logger.log("%s. measurement:"%(rep+1))
+                
+                for engine in CandidateEngine:
+                    wallTime = time.time()
+                    pairs = engine.execute(hashes, K)
+                    wallTime = time.time() - wallTime
+                    Logger.log("%s: %s s, %s pairs"%(engine.value, round(wallTime * 1000) / 1000, len(pairs)))
+                
+                Logger.log("")
+    
+    return
+
+def run_parallel_index_tests(conn, offset:int = 0, reps:int = 3, ranges:list = defaultBiggerRanges, maxWorkers:int = None):
+    '''Measures how the parallel index creation scales from 1 to "maxWorkers" processes on the 'MATE_MAIN' corpus.
+    "conn": the connection this test uses to retrieve the data from.
+    "offset" an offset added to all id's retrieved.
+    "reps": the amount of repretitions for each singular test.
+    "ranges": the ranges of tables used.
+    "maxWorkers": the highest amount of processes (default: one per cpu).'''
+    
+    maxWorkers = maxWorkers or os.cpu_count() or 1
+    
+    for tableAmount in ranges:
+        tableDict = db.retrieveTestDataIdRange(conn, db.CorpusType.MATE_MAIN, offset, offset+tableAmount)
+        Logger.log("\n%s tables:"%tableAmount)
+        
+        for rep in range(reps):
+            Logger.log("%s. measurement:"%(rep+1))
+            
+            wallTime = time.time()
+            serialMap = index.create_exact(tableDict, index.ToStringVersion.FULL, index.HashVersion.FNV1)
+            serialTime = time.time() - wallTime
+            Logger.log("serial: %s s"%(round(serialTime * 1000) / 1000))
+            
+            for workers in range(1, maxWorkers + 1):
+                wallTime = time.time()
+                parallelMap = index.create_exact_parallel(tableDict, index.ToStringVersion.FULL, index.HashVersion.FNV1, workers)
+                wallTime = time.time() - wallTime
+                
+                if(parallelMap != serialMap): Logger.log("The index of %s processes differs!"%workers)
+                Logger.log("%s processes: %s s, speedup %s"%(workers, round(wallTime * 1000) / 1000, round(serialTime / max(wallTime, 1e-9) * 100) / 100))
+            
+            Logger.log("")
+    
+    return
+
+def run_verification_tests(conn, offset:int = 0, reps:int = 3, ranges:list = defaultSmallerRanges, minBucketSize:int = 3):
+    '''Compares the nested loop verification with the hash join verification on the big buckets of the 'MATE_MAIN' corpus.
+    "conn": the connection this test uses to retrieve the data from.
+    "offset" an offset added to all id's retrieved.
+    "reps": the amount of repretitions for each singular test.
+    "ranges": the ranges of tables used.
+    "minBucketSize": only the tables of buckets with at least this many tables are deduplicated.'''
+    
+    for tableAmount in ranges:
+        tableDict = db.retrieveTestDataIdRange(conn, db.CorpusType.MATE_MAIN, offset, offset+tableAmount)
+        
+        # only the tables of the big buckets
+        hashMap = index.create_exact(tableDict, index.ToStringVersion.SIMPLE, index.HashVersion.FNV1)
+        bigBucketIds = sorted(tableId for bucket in hashMap.values() if len(bucket) >= minBucketSize for tableId in bucket)
+        bigBucketDict = {tableId: tableDict[tableId] for tableId in bigBucketIds}
+        Logger.log("\n%s tables, %s of them in buckets of at least %s tables:"%(tableAmount, len(bigBucketIds), minBucketSize))
+        
+        for rep in range(reps):
+            Logger.log("%s. measurement:"%(rep+1))
+            
+            results = dict()
+            times = dict()
+            for verification in dedup.VerificationVersion:
+                wallTime = time.time()
+                results[verification] = dedup.deduplicate(bigBucketDict, index.ToStringVersion.SIMPLE, index.HashVersion.FNV1, verification=verification)
+                times[verification] = time.time() - wallTime
+            
+            if(results[dedup.VerificationVersion.NESTED_LOOP] != results[dedup.VerificationVersion.HASH_JOIN]): Logger.log("The results of the verifications differ!")
+            Logger.log("nested loop: %s s, hash join: %s s, speedup %s"%(round(times[dedup.VerificationVersion.NESTED_LOOP] * 1000) / 1000, round(times[dedup.VerificationVersion.HASH_JOIN] * 1000) / 1000,
+                                                                       round(times[dedup.VerificationVersion.NESTED_LOOP] / max(times[dedup.VerificationVersion.HASH_JOIN], 1e-9) * 100) / 100))
+            Logger.log("")
+    
+    return
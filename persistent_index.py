@@ -0,0 +1,195 @@
+import os
+import struct
+from typing import Dict, Iterable, List, Set
+
+import Logger
+import index
+from index import HashVersion, ToStringVersion
+
+#####################################################################################################################################################################################
+# persistent version of the index of 'index.create_exact': hash -> [tableIds...]
+# the index is stored in two files, so a growing corpus only needs to hash its new tables:
+#   segment:    compacted entries (hash, tableid) sorted by hash and tableid
+#   log:        append-only records of all the changes since the last compaction
+# both files start with a header containing the string representation and hash function used, since mixing them would break the index
+# hashes have up to 128 bits (simhash 128 bit) and are stored as two unsigned 64 bit integers (low, high)
+# the buckets changed since the last verification are recorded in the log also, so an interrupted run verifies them again next time
+
+MAGIC = b"PIDX0001"
+HEADER = struct.Struct("<8s32s32s")
+# hash (low, high), tableid
+ENTRY = struct.Struct("<QQq")
+# operation, hash (low, high), tableid
+RECORD = struct.Struct("<BQQq")
+
+# operations of the log
+ADD = 1
+REMOVE = 2
+CHANGED = 3     # the bucket has to be verified (rewritten when compacting)
+VERIFIED = 4    # all the buckets changed before have been verified
+
+HASH_MASK = (1 << 64) - 1
+
+# the log is compacted into the segment as soon as it has more records than this share of the entries of the index (but at least 'compactionMinRecords')
+compactionRatio = 0.5
+compactionMinRecords = 100000
+
+class PersistentExactIndex:
+    '''Exact hash index stored on disk, which is updated incrementally by adding and removing tables.
+    The whole index is kept in memory while it is open: bucket -> [tableIds...] and tableid -> bucket.'''
+
+    def __init__(self, path:str, strFunc:ToStringVersion=ToStringVersion.FULL, hashFunc:HashVersion=HashVersion.FNV1):
+        self.segmentPath = path + ".segment"
+        self.logPath = path + ".log"
+        self.strFunc = strFunc
+        self.hashFunc = hashFunc
+        self.header = HEADER.pack(MAGIC, strFunc.value.encode("utf-8"), hashFunc.value.encode("utf-8"))
+
+        # hash -> [tableIds...]
+        self.buckets:Dict[int,List[int]] = dict()
+        # tableid -> hash
+        self.tableHashes:Dict[int,int] = dict()
+        # buckets changed since the last verification
+        self.changed:Set[int] = set()
+        # amount of records in the log
+        self.logRecords = 0
+
+        directory = os.path.dirname(path)
+        if(directory): os.makedirs(directory, exist_ok=True)
+
+        if(os.path.exists(self.segmentPath)): self.__readSegment()
+        if(os.path.exists(self.logPath)): self.__replayLog()
+
+    def __len__(self)->int:
+        return len(self.tableHashes)
+
+    def __contains__(self, tableid)->bool:
+        return tableid in self.tableHashes
+
+    def __checkHeader(self, data:bytes, path:str):
+        if(data[:len(MAGIC)] != MAGIC): raise ValueError("The file %s is not a persistent index!"%path)
+        if(data[:HEADER.size] != self.header):
+            _, strValue, hashValue = HEADER.unpack_from(data)
+            raise ValueError("The index %s was created with %s %s instead of %s %s!"%(path, strValue.rstrip(b"\0").decode("utf-8"), hashValue.rstrip(b"\0").decode("utf-8"), self.strFunc.value, self.hashFunc.value))
+
+    def __insert(self, hash:int, tableid:int):
+        # a table can only be part of one bucket
+        if(tableid in self.tableHashes):
+            if(self.tableHashes[tableid] == hash): return
+            self.__delete(tableid)
+        self.tableHashes[tableid] = hash
+        if hash not in self.buckets:
+            self.buckets[hash] = []
+        self.buckets[hash].append(tableid)
+
+    def __delete(self, tableid:int):
+        hash = self.tableHashes.pop(tableid)
+        bucket = self.buckets[hash]
+        bucket.remove(tableid)
+        if(len(bucket) == 0): del self.buckets[hash]
+
+    def __readSegment(self):
+        with open(self.segmentPath, "rb") as f:
+            data = f.read()
+        self.__checkHeader(data, self.segmentPath)
+
+        # the entries are sorted, so every bucket is filled in the order of its tableids
+        for low, high, tableid in ENTRY.iter_unpack(memoryview(data)[HEADER.size:]):
+            self.__insert((high << 64) | low, tableid)
+
+    def __replayLog(self):
+        with open(self.logPath, "rb") as f:
+            data = f.read()
+        self.__checkHeader(data, self.logPath)
+
+        # an interrupted append may leave an incomplete record at the end, which is ignored
+        end = HEADER.size + (len(data) - HEADER.size) // RECORD.size * RECORD.size
+        # replaying is idempotent, so a log, which was already compacted into the segment, does not change the index
+        for operation, low, high, tableid in RECORD.iter_unpack(memoryview(data)[HEADER.size:end]):
+            hash = (high << 64) | low
+            if(operation == ADD):
+                if(tableid in self.tableHashes): self.changed.add(self.tableHashes[tableid])
+                self.__insert(hash, tableid)
+                self.changed.add(hash)
+            elif(operation == REMOVE):
+                if(tableid in self.tableHashes): self.__delete(tableid)
+                self.changed.add(hash)
+            elif(operation == CHANGED):
+                self.changed.add(hash)
+            elif(operation == VERIFIED):
+                self.changed.clear()
+            self.logRecords += 1
+
+    def __appendRecords(self, records:List[tuple]):
+        if(len(records) == 0): return
+        with open(self.logPath, "ab") as f:
+            if(f.tell() == 0): f.write(self.header)
+            f.write(b"".join(RECORD.pack(operation, hash & HASH_MASK, hash >> 64, tableid) for operation, hash, tableid in records))
+        self.logRecords += len(records)
+
+        if(self.logRecords > max(compactionMinRecords, compactionRatio * len(self.tableHashes))): self.compact()
+
+    def add(self, data:dict):
+        '''Hashes all the tables of the given data and adds them to the index.
+        Tables already part of the index are replaced (e.g. if their contents changed).'''
+
+        hashMap = index.create_exact(data, self.strFunc, self.hashFunc)
+
+        records = []
+        for hash in hashMap:
+            for tableid in hashMap[hash]:
+                # the old bucket of a replaced table changes as well
+                if(tableid in self.tableHashes and self.tableHashes[tableid] != hash):
+                    self.changed.add(self.tableHashes[tableid])
+                self.__insert(hash, tableid)
+                self.changed.add(hash)
+                records.append((ADD, hash, tableid))
+
+        self.__appendRecords(records)
+
+    def remove(self, tableIds:Iterable[int]):
+        '''Removes the given tables from the index. Tables not part of the index are ignored.'''
+
+        records = []
+        for tableid in tableIds:
+            if(tableid not in self.tableHashes): continue
+            hash = self.tableHashes[tableid]
+            self.__delete(tableid)
+            self.changed.add(hash)
+            records.append((REMOVE, hash, tableid))
+
+        self.__appendRecords(records)
+
+    def lookup(self, hash:int)->List[int]:
+        '''Returns the ids of all the tables with the given hash.'''
+        return list(self.buckets.get(hash, ()))
+
+    def changedBuckets(self)->Dict[int,list]:
+        '''Returns all the buckets changed since the last verification, which contain more than one table: hash -> [tableIds...].'''
+        # the tableids are sorted, just like in the buckets of 'index.create_exact'
+        return {hash: sorted(self.buckets[hash]) for hash in self.changed if hash in self.buckets and len(self.buckets[hash]) > 1}
+
+    def markVerified(self):
+        '''Records, that all the changed buckets have been verified.'''
+        self.changed.clear()
+        self.__appendRecords([(VERIFIED, 0, -1)])
+
+    def compact(self):
+        '''Writes all the entries of the index into a new segment and starts a new log.'''
+
+        entries = sorted((hash, tableid) for tableid, hash in self.tableHashes.items())
+
+        # write to temporary files first, so an interrupted compaction never leaves a broken index behind
+        with open(self.segmentPath + ".tmp", "wb") as f:
+            f.write(self.header)
+            f.write(b"".join(ENTRY.pack(hash & HASH_MASK, hash >> 64, tableid) for hash, tableid in entries))
+        os.replace(self.segmentPath + ".tmp", self.segmentPath)
+
+        # the buckets, which still have to be verified, are carried over into the new log
+        with open(self.logPath + ".tmp", "wb") as f:
+            f.write(self.header)
+            f.write(b"".join(RECORD.pack(CHANGED, hash & HASH_MASK, hash >> 64, -1) for hash in sorted(self.changed)))
+        os.replace(self.logPath + ".tmp", self.logPath)
+        self.logRecords = len(self.changed)
+
+        Logger.log("Compacted the index %s (%s tables)!"%(self.segmentPath, len(entries)))
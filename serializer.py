@@ -0,0 +1,87 @@
+from typing import Iterator, List
+
+#####################################################################################################################################################################################
+# streaming versions of the string representations of 'index.py'
+# instead of building the whole string of a table, the string is emitted as a stream of chunks (about one row each)
+# joining all the chunks results in exactly the same string as the respective 'toString' function
+# every chunk border is next to a separator (tab, spaces or line break), so the chunks can be processed one after another
+
+def __trimmed(chunks:Iterator[str], count:int)->Iterator[str]:
+    '''Yields the given chunks without the last 'count' characters of the whole stream (like "string[:-count]").'''
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        if(len(pending) > count):
+            yield pending[:-count]
+            pending = pending[-count:]
+
+def __simpleRows(table:List[list])->Iterator[str]:
+    for rowid in table:
+        yield "".join(table[rowid][colid] + "\t" for colid in table[rowid]) + "\n"
+
+def stream_simple(table:List[list])->Iterator[str]:
+    '''Streams the same string as 'index.toString_simple'.'''
+    return __trimmed(__simpleRows(table), 2)
+
+def __indentRows(table:List[list])->Iterator[str]:
+
+    # find out how long the longest cell in each column is
+    maxColLenght = [0]* len(table[0])
+
+    for rowid in table:
+        for colid in table[rowid]:
+            cellLenght = len(table[rowid][colid])
+            if(maxColLenght[colid] < cellLenght):
+                maxColLenght[colid] = cellLenght
+
+    for rowid in table:
+        row = table[rowid]
+        # the padding is put in front of every cell
+        yield "".join(" " * (maxColLenght[colid] - len(row[colid])) + row[colid] + "  " for colid in row) + "\n"
+
+def stream_indent(table:List[list])->Iterator[str]:
+    '''Streams the same string as 'index.toString_indent'.'''
+
+    # empty table
+    if len(table) == 0 or len(table[0]) == 0: return iter(())
+
+    return __trimmed(__indentRows(table), 3)
+
+def __fullRows(table:List[list])->Iterator[str]:
+
+    # find out how long the longest cell in each column is
+    maxColLenMap = [0]* len(table[0])
+
+    # also store the longest colid
+    maxColIdLen = 0
+
+    for rowid in table:
+        for colid in table[rowid]:
+            cellLenght = len(table[rowid][colid])
+            if(maxColLenMap[colid] < cellLenght):
+                maxColLenMap[colid] = cellLenght
+
+            # also find the longest colid
+            colidLen = len(str(colid))
+            if maxColIdLen < colidLen:
+                maxColIdLen = colidLen
+
+    # find out how long the longest rowid is
+    maxRowIdLen = len(str(len(table)-1))
+
+    # first the column descriptors
+    yield " " * (maxRowIdLen + 1) + "".join(" " * (maxColLenMap[colid] - maxColIdLen + 1) + str(colid) + " " * (maxColIdLen - len(str(colid)) + 1) for colid in table[0]) + "\n"
+
+    # now all the contents row by row
+    for rowid in table:
+        row = table[rowid]
+        rowid_str = str(rowid)
+        yield rowid_str + " " * (maxRowIdLen - len(rowid_str)) + "".join(" " * (maxColLenMap[colid] - len(row[colid]) + 2) + row[colid] for colid in row) + "\n"
+
+def stream_full(table:List[list])->Iterator[str]:
+    '''Streams the same string as 'index.toString_full'.'''
+
+    # empty table
+    if len(table) == 0 or len(table[0]) == 0: return iter(())
+
+    return __trimmed(__fullRows(table), 1)
@@ -0,0 +1,189 @@
+import atexit
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, List, Tuple
+
+from table_store import SECTIONS, SuperKeyView, TableStore
+
+#####################################################################################################################################################################################
+# corpus published once into shared memory, so a pool of processes can read all the tables without pickling and copying them
+# the sections of a TableStore (see 'table_store.SECTIONS') are copied into a single shared memory block, each starting at a multiple of 8 bytes (like the snapshots)
+# the processes only receive a small handle (name and layout of the block) and the ids of the tables they need, and attach to the block read only
+# nested dicts are converted into a TableStore first, but only if the TableStore represents them exactly (see 'shareable'),...
+# ...otherwise the tables are pickled for every process just like before
+
+ALIGNMENT = 8
+
+class SharedCorpusHandle:
+    '''Everything a process needs to attach to a shared corpus: the name of the shared memory block and (name, format, position, length) of every section.'''
+
+    __slots__ = ("name", "layout")
+
+    def __init__(self, name: str, layout: List[Tuple[str, str, int, int]]):
+        self.name = name
+        self.layout = layout
+
+    def __getstate__(self):
+        return (self.name, self.layout)
+
+    def __setstate__(self, state):
+        self.name, self.layout = state
+
+class SharedTables:
+    '''Reference to some of the tables (and their super keys) of a shared corpus, which is sent to other processes instead of the tables themselves.'''
+
+    __slots__ = ("handle", "tableIds", "withSuperKeys")
+
+    def __init__(self, handle: SharedCorpusHandle, tableIds: List[int], withSuperKeys: bool):
+        self.handle = handle
+        self.tableIds = tableIds
+        self.withSuperKeys = withSuperKeys
+
+    def __getstate__(self):
+        return (self.handle, self.tableIds, self.withSuperKeys)
+
+    def __setstate__(self, state):
+        self.handle, self.tableIds, self.withSuperKeys = state
+
+def __representable(table: dict, superKeys: dict = None) -> bool:
+    # a TableStore has neither empty tables nor empty rows, the row and column ids are the positions and every cell is a string
+    if(len(table) == 0): return False
+    for position, rowid in enumerate(table):
+        row = table[rowid]
+        if(rowid != position or len(row) == 0): return False
+        for colPosition, colid in enumerate(row):
+            if(colid != colPosition or not isinstance(row[colid], str)): return False
+        if(superKeys is not None and (not isinstance(superKeys.get(rowid), int) or superKeys[rowid] < 0)): return False
+    return True
+
+def shareable(data: dict, superKeys: dict = None) -> bool:
+    '''Returns whether the given tables (and super keys) can be published into shared memory without changing them.'''
+    if(isinstance(data, TableStore)):
+        # the super keys have to be part of the store
+        return superKeys is None or (isinstance(superKeys, SuperKeyView) and superKeys.store is data)
+    return all(__representable(data[tableid], None if superKeys is None else superKeys[tableid]) for tableid in data)
+
+class SharedCorpus:
+    '''Copies the given tables (and super keys) into a shared memory block once, which is removed again when the corpus is closed.'''
+
+    def __init__(self, data: dict, superKeys: dict = None):
+        store = data if isinstance(data, TableStore) else TableStore.fromTables(data, superKeys)
+        self.withSuperKeys = superKeys is not None
+
+        sections = store.sections()
+        buffers = [memoryview(sections[name]).cast('B') for name, _ in SECTIONS]
+
+        layout = []
+        position = 0
+        for i in range(len(SECTIONS)):
+            position += -position % ALIGNMENT
+            layout.append((SECTIONS[i][0], SECTIONS[i][1], position, len(buffers[i])))
+            position += len(buffers[i])
+
+        # a shared memory block cannot be empty
+        self.memory = shared_memory.SharedMemory(create=True, size=max(1, position))
+        for i in range(len(buffers)):
+            _, _, start, length = layout[i]
+            self.memory.buf[start:start + length] = buffers[i]
+
+        self.handle = SharedCorpusHandle(self.memory.name, layout)
+
+    def select(self, tableIds: Iterable[int]) -> SharedTables:
+        '''Returns a reference to the given tables, which can be sent to other processes (see 'resolve').'''
+        return SharedTables(self.handle, list(tableIds), self.withSuperKeys)
+
+    def close(self):
+        '''Removes the shared memory block. The processes attached to it keep their mapping until they exit.'''
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self) -> "SharedCorpus":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class PickledCorpus:
+    '''Fallback for tables, which cannot be shared: the given tables are pickled for every process.'''
+
+    def __init__(self, data: dict, superKeys: dict = None):
+        self.data = data
+        self.superKeys = superKeys
+
+    def select(self, tableIds: Iterable[int]):
+        '''Returns only the given tables (as [tables, superKeys] if the corpus has super keys).'''
+        tableIds = list(tableIds)
+        # a TableStore is sent as a smaller TableStore (token ids), other data as plain dicts (lambdas of defaultdicts cannot be pickled)
+        if(isinstance(self.data, TableStore)): tables = TableStore.fromTables({tableid: self.data[tableid] for tableid in tableIds})
+        else: tables = {tableid: self.data[tableid] for tableid in tableIds}
+        if(self.superKeys is None): return tables
+        return [tables, {tableid: self.superKeys[tableid] for tableid in tableIds}]
+
+    def close(self):
+        pass
+
+    def __enter__(self) -> "PickledCorpus":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def publish(data: dict, superKeys: dict = None):
+    '''Publishes the given tables (and super keys) for a pool of processes: into shared memory if possible (see 'shareable'), otherwise they are pickled.
+    Use as a context manager, the processes receive "corpus.select(tableIds)" and read the tables using 'resolve'.'''
+    if(shareable(data, superKeys)): return SharedCorpus(data, superKeys)
+    return PickledCorpus(data, superKeys)
+
+class AttachedCorpus:
+    '''Shared memory block attached by this process, together with all the views onto its sections and the read only TableStore referencing them.'''
+
+    def __init__(self, handle: SharedCorpusHandle):
+        # the processes of a pool share the resource tracker of the process, which published the block, so attaching does not register it a second time
+        self.memory = shared_memory.SharedMemory(name=handle.name)
+
+        buffer = self.memory.buf.toreadonly()
+        self.views = [buffer]
+        sections = dict()
+        for name, itemFormat, start, length in handle.layout:
+            section = buffer[start:start + length]
+            sections[name] = section.cast(itemFormat)
+            self.views.extend((section, sections[name]))
+
+        self.store = TableStore.fromSections(sections, self)
+
+    def close(self):
+        '''Drops the store, releases all the views and detaches from the shared memory block.
+        Otherwise closing the block when the process exits fails, since the views still export its memory.'''
+        self.store = None
+        for view in reversed(self.views):
+            view.release()
+        self.views = []
+        self.memory.close()
+
+# name of the shared memory block -> corpus attached in this process, so every process attaches to a corpus only once
+__attached:Dict[str,AttachedCorpus] = dict()
+
+def detachAll():
+    '''Detaches this process from all the attached corpora, the stores returned by 'attach' must not be used anymore.
+    Called automatically when a process, which attached to a corpus, exits.'''
+    while len(__attached) > 0:
+        __attached.popitem()[1].close()
+
+def attach(handle: SharedCorpusHandle) -> TableStore:
+    '''Returns a read only TableStore referencing the shared memory block of the given handle without copying it.'''
+
+    corpus = __attached.get(handle.name)
+    if(corpus is not None): return corpus.store
+
+    # the views have to be released before the interpreter closes the block (e.g. when the processes of a pool are spawned instead of forked)
+    if(len(__attached) == 0): atexit.register(detachAll)
+
+    corpus = AttachedCorpus(handle)
+    __attached[handle.name] = corpus
+    return corpus.store
+
+def resolve(data):
+    '''Returns the tables referenced by the given data, which was created by 'select' of a published corpus.'''
+    if(not isinstance(data, SharedTables)): return data
+    store = attach(data.handle).select(data.tableIds)
+    if(data.withSuperKeys): return [store, store.superKeyView()]
+    return store
@@ -0,0 +1,96 @@
+import mmap
+import os
+import struct
+
+import Logger
+import db_handler as db
+from db_handler import CorpusType
+from table_store import SECTIONS, TableStore
+
+#####################################################################################################################################################################################
+# local on-disk snapshots of retrieved corpus ranges
+# a snapshot stores the sections of a TableStore in a single binary file, which is memory mapped when it is loaded again
+# file layout:  header: magic, then offset and length of every section in the order of 'SECTIONS'
+#               body:   the sections, each starting at a multiple of 8 bytes
+
+cacheDirectory = "snapshots"
+
+MAGIC = b"TSNAP001"
+HEADER = struct.Struct("<8s%sq"%(2 * len(SECTIONS)))
+ALIGNMENT = 8
+
+def snapshotPath(corpus: CorpusType, startID: int, endID: int, withSuperKeys: bool) -> str:
+    """Returns the path of the snapshot of the given ID range of the given corpus."""
+    return os.path.join(cacheDirectory, "%s_%s_%s_%s.snapshot"%(corpus.value, startID, endID, "superkeys" if withSuperKeys else "plain"))
+
+def writeSnapshot(path: str, store: TableStore):
+    """Writes the given TableStore into a snapshot file at the given path."""
+
+    sections = store.sections()
+    buffers = [memoryview(sections[name]).cast('B') for name, _ in SECTIONS]
+
+    # every section starts aligned after the header
+    positions = []
+    position = HEADER.size
+    for buffer in buffers:
+        position += -position % ALIGNMENT
+        positions.extend((position, len(buffer)))
+        position += len(buffer)
+
+    directory = os.path.dirname(path)
+    if(directory): os.makedirs(directory, exist_ok=True)
+
+    # write to a temporary file first, so an interrupted write never leaves a broken snapshot behind
+    with open(path + ".tmp", "wb") as f:
+        f.write(HEADER.pack(MAGIC, *positions))
+        for i in range(len(buffers)):
+            f.write(b"\0" * (positions[2 * i] - f.tell()))
+            f.write(buffers[i])
+    os.replace(path + ".tmp", path)
+
+def readSnapshot(path: str) -> TableStore:
+    """Memory maps the snapshot file at the given path and returns a read only TableStore referencing the mapped memory."""
+
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    header = HEADER.unpack_from(mapped)
+    if(header[0] != MAGIC): raise ValueError("The file %s is not a snapshot!"%path)
+
+    memory = memoryview(mapped)
+    sections = dict()
+    for i in range(len(SECTIONS)):
+        name, itemFormat = SECTIONS[i]
+        position, length = header[1 + 2 * i], header[2 + 2 * i]
+        sections[name] = memory[position:position + length].cast(itemFormat)
+
+    return TableStore.fromSections(sections, mapped)
+
+def retrieveTestDataIdRange(connection, corpus: CorpusType, startID: int, endID: int) -> TableStore:
+    """Returns all the tables of the given ID range from the given corpus as a TableStore.
+    The tables are only retrieved from the given connection if there is no snapshot of the range yet.
+    Without a connection, only existing snapshots can be used."""
+
+    path = snapshotPath(corpus, startID, endID, False)
+
+    if(not os.path.exists(path)):
+        if(connection is None): raise FileNotFoundError("There is no snapshot %s and no connection to create it!"%path)
+        writeSnapshot(path, db.retrieveTestDataIdRange(connection, corpus, startID, endID, compact=True))
+        Logger.log("Created snapshot %s!"%path)
+
+    return readSnapshot(path)
+
+def retrieveTestDataWithSuperKeysIdRange(connection, startID: int, endID: int) -> list:
+    """Returns all the tables of the given ID range from the 'MATE_MAIN' corpus as a TableStore together with a view onto their super keys.
+    The tables are only retrieved from the given connection if there is no snapshot of the range yet.
+    Without a connection, only existing snapshots can be used."""
+
+    path = snapshotPath(CorpusType.MATE_MAIN, startID, endID, True)
+
+    if(not os.path.exists(path)):
+        if(connection is None): raise FileNotFoundError("There is no snapshot %s and no connection to create it!"%path)
+        writeSnapshot(path, db.retrieveTestDataWithSuperKeysIdRange(connection, startID, endID, compact=True)[0])
+        Logger.log("Created snapshot %s!"%path)
+
+    store = readSnapshot(path)
+    return [store, store.superKeyView()]
@@ -0,0 +1,306 @@
+from array import array
+import copy
+from typing import Dict, Iterable, Iterator, List
+
+#####################################################################################################################################################################################
+# compact, dictionary encoded storage of many tables
+# every distinct token is stored only once and referenced by an int32 token id
+# datastructure:    cells:          token ids of all the cells of all the tables, row after row
+#                   rowOffsets:     row i consists of cells[rowOffsets[i]:rowOffsets[i+1]]
+#                   tableOffsets:   table t consists of the rows tableOffsets[t] to tableOffsets[t+1]-1
+#                   tableIds:       the tableid of table t
+# row and column ids are the positions of the rows and columns (0, 1, ...), just like in the corpora.
+# indexing works just like with the nested dicts: store[tableid][rowid][colid] -> token
+#
+# the whole store can be converted into flat buffers ("sections") and back, e.g. to store it in a file or in shared memory
+# a store created from sections only references the given buffers and decodes tokens and super keys lazily
+
+# all the sections of a store with the format of their items
+SECTIONS = (("tokenOffsets", 'q'), ("tokenBytes", 'B'), ("cells", 'i'), ("rowOffsets", 'q'),
+            ("tableOffsets", 'q'), ("tableIds", 'q'), ("superKeys", 'B'))
+
+class TokenTable:
+    '''Read only sequence of tokens, which are decoded lazily from a buffer of utf-8 encoded tokens: tokens[tokenId] -> token.'''
+
+    def __init__(self, tokenOffsets, tokenBytes):
+        self.tokenOffsets = tokenOffsets
+        self.tokenBytes = tokenBytes
+        # already decoded tokens
+        self.decoded = [None] * (len(tokenOffsets) - 1)
+
+    def __len__(self)->int:
+        return len(self.decoded)
+
+    def __getitem__(self, tokenId:int)->str:
+        token = self.decoded[tokenId]
+        if(token is None):
+            token = str(self.tokenBytes[self.tokenOffsets[tokenId]:self.tokenOffsets[tokenId + 1]], "utf-8")
+            self.decoded[tokenId] = token
+        return token
+
+class SuperKeyTable:
+    '''Read only sequence of super keys, which are stored with the same amount of bytes each: superKeys[row] -> super_key.'''
+
+    def __init__(self, superKeyBytes, width:int):
+        self.superKeyBytes = superKeyBytes
+        self.width = width
+
+    def __len__(self)->int:
+        return 0 if self.width == 0 else len(self.superKeyBytes) // self.width
+
+    def __getitem__(self, row:int)->int:
+        start = row * self.width
+        return int.from_bytes(self.superKeyBytes[start:start + self.width], "big")
+
+class RowView:
+    '''Read only view onto a single row of a TableStore: row[colid] -> token (or token id, if the store is encoded).'''
+
+    __slots__ = ("store", "start", "end")
+
+    def __init__(self, store:"TableStore", start:int, end:int):
+        self.store = store
+        self.start = start
+        self.end = end
+
+    def __len__(self)->int:
+        return self.end - self.start
+
+    def __iter__(self)->Iterator[int]:
+        return iter(range(self.end - self.start))
+
+    def __contains__(self, colid)->bool:
+        return isinstance(colid, int) and 0 <= colid < self.end - self.start
+
+    def __getitem__(self, colid:int):
+        if(not isinstance(colid, int) or colid < 0 or colid >= self.end - self.start): raise KeyError(colid)
+        tokenId = self.store.cells[self.start + colid]
+        return self.store.tokens[tokenId] if self.store.decodeTokens else tokenId
+
+    def keys(self)->range:
+        return range(self.end - self.start)
+
+    def values(self)->list:
+        tokenIds = self.store.cells[self.start:self.end]
+        if(not self.store.decodeTokens): return list(tokenIds)
+        tokens = self.store.tokens
+        return [tokens[tokenId] for tokenId in tokenIds]
+
+    def items(self)->list:
+        return list(enumerate(self.values()))
+
+class TableView:
+    '''Read only view onto a single table of a TableStore: table[rowid] -> RowView.'''
+
+    __slots__ = ("store", "start", "end")
+
+    def __init__(self, store:"TableStore", start:int, end:int):
+        self.store = store
+        self.start = start
+        self.end = end
+
+    def __len__(self)->int:
+        return self.end - self.start
+
+    def __iter__(self)->Iterator[int]:
+        return iter(range(self.end - self.start))
+
+    def __contains__(self, rowid)->bool:
+        return isinstance(rowid, int) and 0 <= rowid < self.end - self.start
+
+    def __getitem__(self, rowid:int)->RowView:
+        if(not isinstance(rowid, int) or rowid < 0 or rowid >= self.end - self.start): raise KeyError(rowid)
+        row = self.start + rowid
+        rowOffsets = self.store.rowOffsets
+        return RowView(self.store, rowOffsets[row], rowOffsets[row + 1])
+
+    def keys(self)->range:
+        return range(self.end - self.start)
+
+    def values(self)->List[RowView]:
+        return [self[rowid] for rowid in range(self.end - self.start)]
+
+    def items(self)->list:
+        return list(enumerate(self.values()))
+
+class SuperKeyView:
+    '''Read only view onto the super keys of a TableStore: superKeys[tableid][rowid] -> super_key.'''
+
+    def __init__(self, store:"TableStore"):
+        self.store = store
+
+    def __len__(self)->int:
+        return len(self.store)
+
+    def __iter__(self)->Iterator[int]:
+        return iter(self.store)
+
+    def __contains__(self, tableid)->bool:
+        return tableid in self.store
+
+    def __getitem__(self, tableid:int)->Dict[int,int]:
+        position = self.store.tableIndex[tableid]
+        start = self.store.tableOffsets[position]
+        end = self.store.tableOffsets[position + 1]
+        superKeys = self.store.superKeys
+        return {rowid: superKeys[start + rowid] for rowid in range(end - start)}
+
+    def keys(self):
+        return self.store.keys()
+
+class TableStore:
+    '''Stores tables as int32 token ids with row and table offsets instead of nested dicts of strings.
+    Supports the same indexing as the nested dicts: store[tableid][rowid][colid] -> token.
+    The tables have to be filled in the order of their tableids, rowids and colids (the order of the queries in db_handler).'''
+
+    def __init__(self):
+        # token id -> token
+        self.tokens:list = []
+        # token -> token id, only needed while filling the store
+        self.tokenIds:Dict[str,int] = dict()
+
+        self.cells = array('i')
+        self.rowOffsets = array('q', [0])
+        self.tableOffsets = array('q', [0])
+        self.tableIds = array('q')
+        # tableid -> position of the table in 'tableOffsets'
+        self.tableIndex:Dict[int,int] = dict()
+        # super key of every row, only filled if super keys are appended
+        self.superKeys:list = []
+
+        # whether the views return the tokens themselves or only their ids
+        self.decodeTokens = True
+
+        # object owning the memory of the sections, if the store was created from sections
+        self.buffer = None
+
+        # position of the table and row that is currently filled
+        self.currentTableId = None
+        self.currentRowId = None
+
+    @classmethod
+    def fromTables(cls, allTables:dict, allSuperKeys:dict=None)->"TableStore":
+        '''Creates a TableStore from the given tables, which are structured "[tableid][rowid][columnid]->data".'''
+        store = cls()
+        for tableid in allTables:
+            store.appendTable(tableid, allTables[tableid], None if allSuperKeys is None else allSuperKeys[tableid])
+        return store
+
+    @classmethod
+    def fromSections(cls, sections:dict, buffer=None)->"TableStore":
+        '''Creates a read only TableStore referencing the given sections (see 'SECTIONS') without copying them.
+        The given buffer is the object owning the memory of the sections, it is kept alive as long as the store.'''
+        store = cls()
+        store.buffer = buffer
+        store.tokens = TokenTable(sections["tokenOffsets"], sections["tokenBytes"])
+        store.cells = sections["cells"]
+        store.rowOffsets = sections["rowOffsets"]
+        store.tableOffsets = sections["tableOffsets"]
+        store.tableIds = sections["tableIds"]
+        store.tableIndex = {tableid: position for position, tableid in enumerate(store.tableIds)}
+        rowCount = len(store.rowOffsets) - 1
+        store.superKeys = SuperKeyTable(sections["superKeys"], 0 if rowCount == 0 else len(sections["superKeys"]) // rowCount)
+        return store
+
+    def sections(self)->dict:
+        '''Returns the content of this store as flat buffers, one for each of 'SECTIONS'.'''
+
+        if(len(self.tableIds) != len(self.tableOffsets) - 1): raise ValueError("A selection of a store cannot be converted into sections!")
+
+        if(isinstance(self.tokens, TokenTable)):
+            tokenOffsets = self.tokens.tokenOffsets
+            tokenBytes = self.tokens.tokenBytes
+        else:
+            encodedTokens = [token.encode("utf-8") for token in self.tokens]
+            tokenOffsets = array('q', [0])
+            for encodedToken in encodedTokens:
+                tokenOffsets.append(tokenOffsets[-1] + len(encodedToken))
+            tokenBytes = b"".join(encodedTokens)
+
+        if(isinstance(self.superKeys, SuperKeyTable)):
+            superKeyBytes = self.superKeys.superKeyBytes
+        elif(len(self.superKeys) == 0):
+            superKeyBytes = b""
+        else:
+            # all the super keys are stored with the width of the longest one
+            width = max(1, (max(superKey.bit_length() for superKey in self.superKeys) + 7) // 8)
+            superKeyBytes = b"".join(superKey.to_bytes(width, "big") for superKey in self.superKeys)
+
+        return {"tokenOffsets": tokenOffsets, "tokenBytes": tokenBytes, "cells": self.cells, "rowOffsets": self.rowOffsets,
+                "tableOffsets": self.tableOffsets, "tableIds": self.tableIds, "superKeys": superKeyBytes}
+
+    def internToken(self, token:str)->int:
+        '''Returns the token id of the given token. Unknown tokens get a new id.'''
+        tokenId = self.tokenIds.get(token)
+        if(tokenId is None):
+            tokenId = len(self.tokens)
+            self.tokenIds[token] = tokenId
+            self.tokens.append(token)
+        return tokenId
+
+    def appendCell(self, tableid:int, rowid:int, colid:int, token:str, superKey:int=None):
+        '''Appends a single cell. The cells have to be appended ordered by tableid, rowid and colid,
+        a new table or row is started as soon as the tableid or rowid changes.'''
+
+        if(tableid != self.currentTableId):
+            if(tableid in self.tableIndex): raise ValueError("The cells of table %s are not appended consecutively!"%tableid)
+            self.tableIndex[tableid] = len(self.tableIds)
+            self.tableIds.append(tableid)
+            self.tableOffsets.append(self.tableOffsets[-1])
+            self.currentTableId = tableid
+            self.currentRowId = None
+
+        if(rowid != self.currentRowId):
+            self.rowOffsets.append(self.rowOffsets[-1])
+            self.tableOffsets[-1] += 1
+            self.currentRowId = rowid
+            if(superKey is not None): self.superKeys.append(superKey)
+
+        self.cells.append(self.internToken(token))
+        self.rowOffsets[-1] = len(self.cells)
+
+    def appendTable(self, tableid:int, table:dict, superKeys:dict=None):
+        '''Appends a whole table, which is structured "[rowid][columnid]->data".'''
+        for rowid in table:
+            superKey = None if superKeys is None else superKeys[rowid]
+            for colid in table[rowid]:
+                self.appendCell(tableid, rowid, colid, table[rowid][colid], superKey)
+
+    def encoded(self)->"TableStore":
+        '''Returns a view onto the same data, which returns token ids instead of tokens.
+        Comparing the cells of this view only needs integer comparisons.'''
+        view = copy.copy(self)
+        view.decodeTokens = False
+        return view
+
+    def select(self, tableIds:Iterable[int])->"TableStore":
+        '''Returns a view onto only the given tables of this store, without copying them (e.g. the tables a single process works on).'''
+        view = copy.copy(self)
+        view.tableIndex = {tableid: self.tableIndex[tableid] for tableid in tableIds}
+        view.tableIds = list(view.tableIndex)
+        return view
+
+    def superKeyView(self)->SuperKeyView:
+        '''Returns a view onto the super keys structured "[tableid][rowid]->super_key".'''
+        return SuperKeyView(self)
+
+    def __len__(self)->int:
+        return len(self.tableIds)
+
+    def __iter__(self)->Iterator[int]:
+        return iter(self.tableIds)
+
+    def __contains__(self, tableid)->bool:
+        return tableid in self.tableIndex
+
+    def __getitem__(self, tableid:int)->TableView:
+        position = self.tableIndex[tableid]
+        return TableView(self, self.tableOffsets[position], self.tableOffsets[position + 1])
+
+    def keys(self):
+        return self.tableIndex.keys()
+
+    def values(self)->List[TableView]:
+        return [self[tableid] for tableid in self.tableIds]
+
+    def items(self)->list:
+        return [(tableid, self[tableid]) for tableid in self.tableIds]